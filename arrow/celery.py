@@ -11,6 +11,9 @@ backend = os.environ[
     'CELERY_BACKEND'] if 'CELERY_BACKEND' in os.environ.keys() else 'redis://localhost:6379'
 broker = os.environ[
     'CELERY_BROKER'] if 'CELERY_BROKER' in os.environ.keys() else 'redis://localhost:6379'
+# same as settings.CONTEST_STATUS_SWEEP_INTERVAL, settings are not loaded yet
+contest_status_sweep_interval = float(
+    os.environ.get('CONTEST_STATUS_SWEEP_INTERVAL', 60))
 
 app = Celery('arrow',
              broker=broker,
@@ -26,9 +29,15 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
-    'update-contest-status-every-1-second': {
+    # contests are started and ended by tasks scheduled at their time, this
+    # only catches up after downtime and schedules upcoming ones
+    'update-contest-status-sweep': {
         'task': 'contester.tasks.update_contest_status',
-        'schedule': 1.0,
+        'schedule': contest_status_sweep_interval,
+    },
+    'delete-unused-compilation-artifacts-every-day': {
+        'task': 'polygon.tasks.delete_unused_compilation_artifacts',
+        'schedule': 24 * 60 * 60.0,
     },
 }
 
@@ -170,6 +170,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, "production_static")
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Test data (see polygon/blob_store.py). Any django storage class, e.g.
+# storages.backends.s3boto3.S3Boto3Storage, location is its root or prefix.
+TEST_BLOB_STORAGE = os.environ.get(
+    'TEST_BLOB_STORAGE', 'django.core.files.storage.FileSystemStorage')
+TEST_BLOB_STORAGE_LOCATION = os.environ.get(
+    'TEST_BLOB_STORAGE_LOCATION', os.path.join(MEDIA_ROOT, 'tests'))
+
 # Auth
 
 LOGIN_URL = '/accounts/login'
@@ -189,4 +196,100 @@ MESSAGE_TAGS = {
 CELERY_TASK_ROUTES = ([
                           ('polygon.tasks.judge_submission_task',
                            {'queue': 'sandbox_execution'}),
+                          ('polygon.tasks.prewarm_test_inputs',
+                           {'queue': 'sandbox_execution'}),
+                          ('polygon.tasks.compile_submission_task',
+                           {'queue': 'compilation'}),
+                          ('polygon.tasks.run_rejudge_job',
+                           {'queue': 'rejudge'}),
                       ],)
+# Judging task takes minutes, so worker must not reserve tasks it can not
+# start now, otherwise contest submission waits behind reserved rejudges.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Worker takes next task from the first non empty queue in the order of
+# its -Q option, so queues listed first are strictly preferred. Messages of
+# one queue are ordered by priority, 0 is the highest.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+}
+
+# Launched contests are checked every CONTEST_STATUS_SWEEP_INTERVAL seconds
+# and their starts and ends before the next check are scheduled to the exact
+# time (see contester/tasks.py)
+CONTEST_STATUS_SWEEP_INTERVAL = int(
+    os.environ.get('CONTEST_STATUS_SWEEP_INTERVAL', 60))
+
+# Server-sent event streams open at once on all web servers, every stream
+# holds a gevent connection of gunicorn (see gunicorn.conf.py) and a redis
+# connection. Pages fall back to reloading when the limit is reached.
+EVENT_STREAM_MAX_CONNECTIONS = int(
+    os.environ.get('EVENT_STREAM_MAX_CONNECTIONS', 2000))
+
+# Judge
+# Every worker process runs tests in isolate boxes
+# JUDGE_FIRST_BOX_ID ... JUDGE_FIRST_BOX_ID + JUDGE_BOX_COUNT - 1.
+# With more than one box tests of a submission are executed in parallel,
+# usually one box per physical core. Box ranges of workers on the same host
+# must not overlap.
+JUDGE_BOX_COUNT = int(os.environ.get('JUDGE_BOX_COUNT', 1))
+JUDGE_FIRST_BOX_ID = int(os.environ.get('JUDGE_FIRST_BOX_ID', 0))
+
+# Worker side caches (compiled artifacts and so on) live here
+JUDGE_CACHE_DIR = os.environ.get('JUDGE_CACHE_DIR',
+                                 os.path.join(BASE_DIR, 'polygon', 'cache'))
+# Size cap of compiled artifacts cache in bytes
+JUDGE_ARTIFACT_CACHE_SIZE = int(
+    os.environ.get('JUDGE_ARTIFACT_CACHE_SIZE', 1024 * 1024 * 1024))
+# Size cap of judge solution answers cache in bytes
+JUDGE_ANSWER_CACHE_SIZE = int(
+    os.environ.get('JUDGE_ANSWER_CACHE_SIZE', 2 * 1024 * 1024 * 1024))
+# Size cap of generated tests inputs cache in bytes
+JUDGE_INPUT_CACHE_SIZE = int(
+    os.environ.get('JUDGE_INPUT_CACHE_SIZE', 4 * 1024 * 1024 * 1024))
+# Size cap of uploaded tests data cache in bytes
+JUDGE_TEST_DATA_CACHE_SIZE = int(
+    os.environ.get('JUDGE_TEST_DATA_CACHE_SIZE', 4 * 1024 * 1024 * 1024))
+# box_root from isolate config (polygon/isolate/default.cf)
+JUDGE_ISOLATE_BOX_ROOT = os.environ.get('JUDGE_ISOLATE_BOX_ROOT',
+                                        '/var/local/lib/isolate')
+
+# Sandboxes (tests input, output, answers, meta files) are created here.
+# Meant to be a size capped tmpfs mounted without noexec, e.g.
+# `--tmpfs /sandbox:rw,exec,size=2g`, so judging does not wait for disk.
+JUDGE_SANDBOX_DISK_ROOT = os.environ.get(
+    'JUDGE_SANDBOX_DISK_ROOT', os.path.join(BASE_DIR, 'polygon', 'temp'))
+JUDGE_SANDBOX_ROOT = os.environ.get('JUDGE_SANDBOX_ROOT',
+                                    JUDGE_SANDBOX_DISK_ROOT)
+# Approximate size of sandbox without tests (payload, compiled binaries)
+JUDGE_SANDBOX_BASE_SIZE = int(
+    os.environ.get('JUDGE_SANDBOX_BASE_SIZE', 64 * 1024 * 1024))
+# Sandbox folders not modified for this many seconds are left by crashed
+# tasks and removed, checked every JUDGE_SANDBOX_GC_INTERVAL seconds.
+JUDGE_SANDBOX_MAX_AGE = int(os.environ.get('JUDGE_SANDBOX_MAX_AGE', 6 * 3600))
+JUDGE_SANDBOX_GC_INTERVAL = int(
+    os.environ.get('JUDGE_SANDBOX_GC_INTERVAL', 10 * 60))
+# Test results of running submission are written to database every
+# JUDGE_RESULT_FLUSH_INTERVAL seconds (0 - only when all tests are done)
+JUDGE_RESULT_FLUSH_INTERVAL = float(
+    os.environ.get('JUDGE_RESULT_FLUSH_INTERVAL', 5))
+# Submissions of problems judged until first failure are first executed on
+# this many tests that fail most often (0 - tests are executed in order).
+JUDGE_PRIORITY_TEST_COUNT = int(os.environ.get('JUDGE_PRIORITY_TEST_COUNT', 3))
+# Compiled submissions not used for this many seconds are deleted from
+# database
+JUDGE_COMPILATION_ARTIFACT_TTL = int(
+    os.environ.get('JUDGE_COMPILATION_ARTIFACT_TTL', 7 * 24 * 3600))
+# Bulk rejudge enqueues judging of this many submissions at once, with
+# rate JUDGE_REJUDGE_RATE submissions per second, to JUDGE_REJUDGE_QUEUE
+JUDGE_REJUDGE_CHUNK_SIZE = int(os.environ.get('JUDGE_REJUDGE_CHUNK_SIZE', 100))
+JUDGE_REJUDGE_RATE = float(os.environ.get('JUDGE_REJUDGE_RATE', 5))
+JUDGE_REJUDGE_QUEUE = os.environ.get('JUDGE_REJUDGE_QUEUE', 'rejudge')
+# Judging of submissions is routed to queue of its origin (see
+# polygon/judge.py), workers subscribe to them with
+# `-Q judge_contest,judge_problemset,sandbox_execution,rejudge`
+JUDGE_CONTEST_QUEUE = os.environ.get('JUDGE_CONTEST_QUEUE', 'judge_contest')
+JUDGE_PROBLEMSET_QUEUE = os.environ.get('JUDGE_PROBLEMSET_QUEUE',
+                                        'judge_problemset')
+JUDGE_POLYGON_QUEUE = os.environ.get('JUDGE_POLYGON_QUEUE',
+                                     'sandbox_execution')
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+def mark_judged_submissions_processed(apps, schema_editor):
+    # verdicts of judged submissions are already applied to profiles
+    ContestUserSubmission = apps.get_model('contester',
+                                           'ContestUserSubmission')
+    ContestUserSubmission.objects.filter(submission__tested=True).update(
+        processed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contester', '0004_contestusersubmission_upsolving'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contestusersubmission',
+            name='processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_judged_submissions_processed,
+                             migrations.RunPython.noop),
+    ]
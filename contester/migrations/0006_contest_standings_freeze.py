@@ -0,0 +1,38 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contester', '0005_contestusersubmission_processed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='freeze_duration',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='contest',
+            name='frozen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='contest',
+            name='is_frozen',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='StandingsSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('rows', models.TextField()),
+                ('contest', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='contester.Contest')),
+            ],
+        ),
+    ]
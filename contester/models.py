@@ -12,8 +12,8 @@ class Contest(models.Model):
     During set up and other stuff nothing really happens beside data updates.
 
     However when admin pushes launch button it sets is_launched to True
-    and then celery task will check every second
-    if there is a contest that should start now or end now.
+    and celery task is scheduled to start it at start_date_time and
+    then to end it (see contester/tasks.py).
 
     Admin can switch contest to manual mode. Then celery scheduler won't touch
     it. But for users start_date_time, end_date_time and duration will be shown
@@ -32,6 +32,11 @@ class Contest(models.Model):
     manual_control = models.BooleanField(default=False)
     is_launched = models.BooleanField(default=False)
     is_public = models.BooleanField(default=False)
+    # Standings are frozen for the last freeze_duration seconds (0 - never):
+    # everyone except staff sees standings at frozen_at until unfreeze.
+    freeze_duration = models.IntegerField(default=0)
+    is_frozen = models.BooleanField(default=False)
+    frozen_at = models.DateTimeField(null=True, blank=True)
 
     def get_duration_minutes(self):
         return self.duration / 60
@@ -52,6 +57,10 @@ class Contest(models.Model):
     def get_tasks(self):
         return self.contesttask_set.order_by('index')
 
+    def get_freeze_datetime(self):
+        return self.get_end_datetime() - timezone.timedelta(
+            seconds=self.freeze_duration)
+
 
 class ContestTask(IndexedModel):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -123,3 +132,15 @@ class ContestUserSubmission(models.Model):
     upsolving = models.BooleanField(default=False)
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE,
                                    null=False)
+    # verdict is applied to profiles (see contester.tasks.process_submission)
+    processed = models.BooleanField(default=False)
+
+
+class StandingsSnapshot(models.Model):
+    """
+    Standings rows (see contester/standings.py) at the moment standings of
+    contest were frozen.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    contest = models.OneToOneField(Contest, on_delete=models.CASCADE)
+    rows = models.TextField()
@@ -0,0 +1,356 @@
+"""
+Cached contest standings.
+
+Standings of contest are kept in redis, so standings page reads only rows
+it shows instead of all profiles of contest:
+  `contest-standings:{id}:rows` - hash {user profile id: row json}, row has
+    totals of profile and its task profiles by task id,
+  `contest-standings:{id}:ranking` and `contest-standings:{id}:upsolving` -
+    sorted sets of user profile ids, lower score is higher place,
+  `contest-standings:{id}:built` - set while all of above are complete.
+
+Standings are built from database when they are requested and there is no
+`built` key, after that process_submission updates row of user profile it
+changes. Everything expires after standings_ttl, so standings are rebuilt
+from database from time to time anyway.
+
+Only one request rebuilds standings, it holds `contest-standings:{id}:lock`
+and other requests wait for it. Rows updated while standings are being
+rebuilt may be missing from rows read from database, so their user profile
+ids are collected in `contest-standings:{id}:pending` and written again
+after the rebuild.
+
+While standings of contest are frozen, everyone except staff sees rows of
+StandingsSnapshot taken at freeze. They are cached the same way with keys
+`contest-standings:{id}:frozen-*`.
+
+Changes are published to pub/sub channel `contest-standings:{id}:events`
+for open standings pages: {"row": row, "place": place} when row is updated
+(not while frozen) and {"reload": true} when standings are invalidated.
+"""
+import json
+import time
+
+import redis
+
+from polygon.progress import get_redis
+from .models import ContestUserProfile, ContestUserTaskProfile, \
+    StandingsSnapshot
+
+standings_ttl = 10 * 60
+
+# building standings of a large contest takes a few seconds
+rebuild_lock_timeout = 60
+rebuild_wait_timeout = 5
+
+# solved count is more important than any penalty
+solved_count_weight = 10 ** 9
+
+frozen_prefix = 'frozen-'
+
+
+def standings_key(contest_id, name):
+    return f'contest-standings:{contest_id}:{name}'
+
+
+def ranking_score(contest, row, upsolving):
+    """
+    :return score of row in ranking or None if it is not in ranking
+    (nothing solved).
+    """
+    if not contest.is_ioi_style:
+        solved_count = row['solved_count_after_contest'] if upsolving else \
+            row['solved_count']
+        if solved_count == 0:
+            return None
+        penalty = 0 if upsolving else row['penalty']
+        return -solved_count * solved_count_weight + penalty
+    points = row['points_after_contest'] if upsolving else row['points']
+    if points == 0:
+        return None
+    return -points
+
+
+def make_row(user_profile, task_profiles):
+    return {
+        'id': user_profile.pk,
+        'user': str(user_profile.user),
+        'solved_count': user_profile.solved_count,
+        'penalty': user_profile.penalty,
+        'points': user_profile.points,
+        'solved_count_after_contest': user_profile.solved_count_after_contest,
+        'points_after_contest': user_profile.points_after_contest,
+        'tasks': {
+            str(task_profile.task_id): {
+                'solved': task_profile.solved,
+                'tries': task_profile.tries,
+                'points': task_profile.points,
+                'solved_after_contest': task_profile.solved_after_contest,
+                'tries_after_contest': task_profile.tries_after_contest,
+                'points_after_contest': task_profile.points_after_contest,
+            } for task_profile in task_profiles
+        },
+    }
+
+
+def write_row(pipeline, contest, row, prefix=''):
+    pipeline.hset(standings_key(contest.pk, prefix + 'rows'), row['id'],
+                  json.dumps(row))
+    for upsolving, name in ((False, 'ranking'), (True, 'upsolving')):
+        key = standings_key(contest.pk, prefix + name)
+        score = ranking_score(contest, row, upsolving)
+        if score is None:
+            pipeline.zrem(key, row['id'])
+        else:
+            pipeline.zadd(key, {row['id']: score})
+
+
+def build_rows(contest, user_profile_ids=None):
+    """
+    :return rows of all user profiles of contest (or only of given ones),
+    made with two queries.
+    """
+    task_profiles = ContestUserTaskProfile.objects.filter(contest=contest)
+    user_profiles = ContestUserProfile.objects.filter(contest=contest)
+    if user_profile_ids is not None:
+        task_profiles = task_profiles.filter(
+            user_profile_id__in=user_profile_ids)
+        user_profiles = user_profiles.filter(pk__in=user_profile_ids)
+    rows_task_profiles = dict()
+    for task_profile in task_profiles:
+        rows_task_profiles.setdefault(task_profile.user_profile_id,
+                                      []).append(task_profile)
+    return [make_row(user_profile,
+                     rows_task_profiles.get(user_profile.pk, []))
+            for user_profile in user_profiles.select_related('user')]
+
+
+def sort_rows(contest, rows, upsolving):
+    # redis orders members with equal score by their string, rows that are
+    # not cached are ordered the same way
+    ranked = [(ranking_score(contest, row, upsolving), str(row['id']), row)
+              for row in rows]
+    return [row for score, _, row in
+            sorted((item for item in ranked if item[0] is not None),
+                   key=lambda item: item[:2])]
+
+
+def standings_keys(contest_id, prefix=''):
+    return [standings_key(contest_id, prefix + name)
+            for name in ('rows', 'ranking', 'upsolving', 'built')]
+
+
+def write_standings(contest, rows, prefix=''):
+    """
+    Replaces cached standings with rows.
+    """
+    keys = standings_keys(contest.pk, prefix)
+    # readers never see half built standings
+    pipeline = get_redis().pipeline(transaction=True)
+    pipeline.delete(*keys)
+    for row in rows:
+        write_row(pipeline, contest, row, prefix)
+    pipeline.set(standings_key(contest.pk, prefix + 'built'), 1)
+    for key in keys:
+        pipeline.expire(key, standings_ttl)
+    pipeline.execute()
+
+
+def rebuild_lock(contest_id):
+    return get_redis().lock(standings_key(contest_id, 'lock'),
+                            timeout=rebuild_lock_timeout)
+
+
+def rebuild_standings(contest):
+    """
+    Replaces cached standings with ones built from database, if they are
+    not being rebuilt by someone else already.
+    :return rows of all user profiles or None if standings are being
+    rebuilt by someone else.
+    """
+    lock = rebuild_lock(contest.pk)
+    if not lock.acquire(blocking=False):
+        return None
+    pending_key = standings_key(contest.pk, 'pending')
+    try:
+        get_redis().delete(pending_key)
+        rows = build_rows(contest)
+        write_standings(contest, rows)
+        # rows changed while rows were read and written, until the lock is
+        # released rows changed meanwhile are marked as pending again
+        while True:
+            pending = get_redis().spop(pending_key, 1000)
+            if not pending:
+                break
+            pipeline = get_redis().pipeline(transaction=True)
+            for row in build_rows(contest, [int(user_profile_id)
+                                            for user_profile_id in pending]):
+                write_row(pipeline, contest, row)
+            pipeline.execute()
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            # expired, someone else may rebuild standings already
+            pass
+    return rows
+
+
+def wait_for_standings(contest):
+    """
+    Waits up to rebuild_wait_timeout seconds for standings rebuilt by
+    someone else.
+    :return True if standings are built.
+    """
+    deadline = time.monotonic() + rebuild_wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        if get_redis().exists(standings_key(contest.pk, 'built')):
+            return True
+    return False
+
+
+def update_standings_row(user_profile):
+    """
+    Writes current state of user profile to cached standings of its contest
+    and publishes it. Nothing is written when standings are not built, they
+    are built from database when requested. While standings are being
+    rebuilt user profile is marked as pending, so its row is written again
+    after the rebuild.
+    """
+    contest = user_profile.contest
+    try:
+        row = make_row(user_profile,
+                       user_profile.contestusertaskprofile_set.all())
+        pipeline = get_redis().pipeline(transaction=True)
+        pipeline.exists(standings_key(contest.pk, 'built'))
+        pipeline.exists(standings_key(contest.pk, 'lock'))
+        built, rebuilding = pipeline.execute()
+        if rebuilding:
+            pipeline = get_redis().pipeline(transaction=True)
+            pipeline.sadd(standings_key(contest.pk, 'pending'), row['id'])
+            pipeline.expire(standings_key(contest.pk, 'pending'),
+                            rebuild_lock_timeout)
+            pipeline.execute()
+        if built:
+            pipeline = get_redis().pipeline(transaction=True)
+            write_row(pipeline, contest, row)
+            pipeline.zrank(standings_key(contest.pk, 'ranking'), row['id'])
+            rank = pipeline.execute()[-1]
+        else:
+            rank = None
+        if not contest.is_frozen:
+            get_redis().publish(standings_key(contest.pk, 'events'),
+                                json.dumps({'row': row,
+                                            'place': None if rank is None
+                                            else rank + 1}))
+    except redis.RedisError as e:
+        print(f'FAILED to update standings of contest {contest.pk}: {e}')
+        invalidate_standings(contest.pk)
+
+
+def invalidate_standings(contest_id):
+    """
+    Standings are rebuilt on the next request (e.g. after profile deletion).
+    """
+    try:
+        get_redis().delete(standings_key(contest_id, 'built'))
+        get_redis().publish(standings_key(contest_id, 'events'),
+                            json.dumps({'reload': True}))
+    except redis.RedisError as e:
+        print(f'FAILED to invalidate standings of contest {contest_id}: {e}')
+
+
+class Standings:
+    """
+    Ranked rows of cached standings, works with Paginator. Every row has
+    `place` and `cells` - task profiles in order of tasks (None if user
+    has no profile of task yet).
+    """
+
+    def __init__(self, contest, tasks, upsolving=False, prefix=''):
+        self.contest = contest
+        self.tasks = tasks
+        self.rows_key = standings_key(contest.pk, prefix + 'rows')
+        self.ranking_key = standings_key(
+            contest.pk, prefix + ('upsolving' if upsolving else 'ranking'))
+
+    def count(self):
+        return get_redis().zcard(self.ranking_key)
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        if stop is None or stop <= start:
+            return []
+        user_profile_ids = get_redis().zrange(self.ranking_key, start,
+                                              stop - 1)
+        if not user_profile_ids:
+            return []
+        raw_rows = get_redis().hmget(self.rows_key, user_profile_ids)
+        rows = [json.loads(raw_row) for raw_row in raw_rows
+                if raw_row is not None]
+        return add_cells(rows, self.tasks, start)
+
+
+def add_cells(rows, tasks, first_place=0):
+    for place, row in enumerate(rows, first_place + 1):
+        row['place'] = place
+        row['cells'] = [row['tasks'].get(str(task.pk)) for task in tasks]
+    return rows
+
+
+def get_standings(contest, tasks, upsolving=False):
+    """
+    :return ranked rows of contest for Paginator, standings are built if
+    they are not cached. Without redis (or if they are not rebuilt by
+    someone else in time) they are made from database.
+    """
+    try:
+        if get_redis().exists(standings_key(contest.pk, 'built')):
+            return Standings(contest, tasks, upsolving)
+        rows = rebuild_standings(contest)
+        if rows is None:
+            if wait_for_standings(contest):
+                return Standings(contest, tasks, upsolving)
+            rows = build_rows(contest)
+    except redis.RedisError as e:
+        print(f'FAILED to get standings of contest {contest.pk}: {e}')
+        rows = build_rows(contest)
+    return add_cells(sort_rows(contest, rows, upsolving), tasks)
+
+
+def take_standings_snapshot(contest):
+    """
+    Saves current standings rows of contest as its frozen standings, if
+    there are none yet.
+    :return StandingsSnapshot
+    """
+    snapshot, _ = StandingsSnapshot.objects.get_or_create(
+        contest=contest, defaults={'rows': json.dumps(build_rows(contest))})
+    return snapshot
+
+
+def get_frozen_standings(contest, tasks):
+    """
+    :return ranked rows of standings snapshot for Paginator, snapshot is
+    taken now if it was not taken at freeze time.
+    """
+    try:
+        if get_redis().exists(standings_key(contest.pk,
+                                            frozen_prefix + 'built')):
+            return Standings(contest, tasks, prefix=frozen_prefix)
+        rows = json.loads(take_standings_snapshot(contest).rows)
+        write_standings(contest, rows, frozen_prefix)
+    except redis.RedisError as e:
+        print(f'FAILED to get frozen standings of contest {contest.pk}: {e}')
+        rows = json.loads(take_standings_snapshot(contest).rows)
+    return add_cells(sort_rows(contest, rows, False), tasks)
+
+
+def delete_standings_snapshot(contest_id):
+    StandingsSnapshot.objects.filter(contest_id=contest_id).delete()
+    try:
+        get_redis().delete(*standings_keys(contest_id, frozen_prefix))
+    except redis.RedisError as e:
+        print(f'FAILED to delete frozen standings of contest {contest_id}: '
+              f'{e}')
@@ -1,21 +1,88 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 
 from arrow.celery import app
 from .models import *
+from .standings import delete_standings_snapshot, invalidate_standings, \
+    take_standings_snapshot, update_standings_row
+
+
+def is_freeze_pending(contest):
+    return contest.freeze_duration > 0 and contest.frozen_at is None
+
+
+def next_status_update_time(contest):
+    """
+    :return when launched contest should be started, frozen or ended next,
+    None if there is nothing to do.
+    """
+    if not contest.is_launched or contest.is_ended:
+        return None
+    if not contest.is_started:
+        return contest.start_date_time
+    if is_freeze_pending(contest):
+        return contest.get_freeze_datetime()
+    return contest.get_end_datetime()
+
+
+def schedule_contest_status_update(contest):
+    """
+    Schedules update_contest_status of contest at its next start or end, if
+    it is before the next sweep, later ones are scheduled by the sweep.
+    Call it when contest is launched or its time is changed, tasks of old
+    time find nothing to do.
+    """
+    eta = next_status_update_time(contest)
+    if eta is None or eta > timezone.now() + timezone.timedelta(
+            seconds=2 * settings.CONTEST_STATUS_SWEEP_INTERVAL):
+        return
+    update_contest_status.apply_async((contest.pk,), eta=eta)
+
+
+def apply_contest_status(contest):
+    """
+    Starts, freezes and ends contest if its time has come. Flags are
+    changed with conditional updates, so concurrent and repeated calls are
+    harmless.
+    """
+    now = timezone.now()
+    launched = Contest.objects.filter(pk=contest.pk, is_launched=True)
+    if not contest.is_started and now >= contest.start_date_time:
+        if launched.filter(is_started=False,
+                           start_date_time__lte=now).update(is_started=True,
+                                                            updated_at=now):
+            print(f'Contest {contest.pk} started')
+        contest.is_started = True
+    if contest.is_started and is_freeze_pending(contest) and \
+            now >= contest.get_freeze_datetime():
+        if launched.filter(frozen_at__isnull=True).update(
+                is_frozen=True, frozen_at=now, updated_at=now):
+            take_standings_snapshot(contest)
+            print(f'Standings of contest {contest.pk} frozen')
+        contest.frozen_at = now
+    if contest.is_started and now >= contest.get_end_datetime():
+        if launched.filter(is_started=True, is_ended=False).update(
+                is_ended=True, updated_at=now):
+            print(f'Contest {contest.pk} ended')
+            check_contest_scores.delay(contest.pk)
+        contest.is_ended = True
 
 
 @app.task()
-def update_contest_status():
-    print('Contest update')
+def update_contest_status(contest_id=None):
+    """
+    With contest_id it is executed at start or end of contest (see
+    schedule_contest_status_update). Without it this is the sweep executed
+    every CONTEST_STATUS_SWEEP_INTERVAL seconds: it applies overdue changes
+    and schedules ones that are due before the next sweep.
+    """
     contests = Contest.objects.filter(is_launched=True, is_ended=False)
+    if contest_id is not None:
+        contests = contests.filter(pk=contest_id)
     for contest in contests:
-        if not contest.is_started and timezone.now() >= contest.start_date_time:
-            contest.is_started = True
-            contest.save()
-        elif timezone.now() >= contest.start_date_time + timezone.timedelta(
-                seconds=contest.duration):
-            contest.is_ended = True
-            contest.save()
+        apply_contest_status(contest)
+        schedule_contest_status_update(contest)
 
 
 bad_verdicts = {
@@ -26,68 +93,159 @@ bad_verdicts = {
     Submission.PE
 }
 
+# Totals of ContestUserProfile, they are sums of changes made by verdicts
+user_profile_totals = ('solved_count', 'penalty', 'points',
+                       'solved_count_after_contest', 'points_after_contest')
+task_profile_fields = ('points', 'solved', 'tries', 'penalty',
+                       'solved_after_contest', 'tries_after_contest',
+                       'points_after_contest')
+
+
+def apply_verdict(contest, task_profile, contest_submission):
+    """
+    Applies verdict of contest submission to task profile (not saved).
+    :return changes of user profile totals, {total: delta}.
+    """
+    submission = contest_submission.submission
+    if not contest.is_started:
+        return {}
+    if not contest.is_ioi_style:
+        if not contest_submission.upsolving:
+            if task_profile.solved:
+                return {}
+            if submission.verdict == Submission.OK:
+                task_profile.solved = True
+                # add penalty to user
+                penalty = (contest_submission.created_at -
+                           contest.start_date_time).seconds / 60
+                task_profile.penalty += penalty
+                return {'solved_count': 1, 'penalty': penalty}
+            if submission.verdict in bad_verdicts:
+                task_profile.tries += 1
+                task_profile.penalty += 20
+                return {'penalty': 20}
+        else:
+            if task_profile.solved_after_contest:
+                return {}
+            if submission.verdict == Submission.OK:
+                task_profile.solved_after_contest = True
+                return {'solved_count_after_contest': 1}
+            if submission.verdict in bad_verdicts:
+                task_profile.tries_after_contest += 1
+        return {}
+    task_profile.tries += 1
+    if not contest_submission.upsolving:
+        points = max(task_profile.points, submission.points)
+        delta, task_profile.points = points - task_profile.points, points
+        return {'points': delta}
+    points = max(task_profile.points_after_contest, submission.points)
+    delta = points - task_profile.points_after_contest
+    task_profile.points_after_contest = points
+    return {'points_after_contest': delta}
+
 
 @app.task()
 def process_submission(_, contest_submission_id: ContestUserSubmission):
-    contest_submission = ContestUserSubmission.objects.get(
-        pk=contest_submission_id)
-    contest = contest_submission.contest
-    contest_user_task_profile = contest_submission.user_task_profile
-    is_upsolving = contest_submission.upsolving
-    user_profile = contest_submission.user_profile
-    if contest.is_started:
-        if not contest.is_ioi_style:
-            if not is_upsolving:
-                if not contest_user_task_profile.solved:
-                    if contest_submission.submission.verdict == Submission.OK:
-                        contest_user_task_profile.solved = True
-                        # add penalty to user
-                        penalty = (
-                                          contest_submission.created_at - contest.start_date_time).seconds / 60
-                        contest_user_task_profile.penalty += penalty
-                    elif contest_submission.submission.verdict in bad_verdicts:
-                        contest_user_task_profile.tries += 1
-                        contest_user_task_profile.penalty += 20
-            else:
-                if not contest_user_task_profile.solved_after_contest:
-                    if contest_submission.submission.verdict == Submission.OK:
-                        contest_user_task_profile.solved_after_contest = True
-                    elif contest_submission.submission.verdict in bad_verdicts:
-                        contest_user_task_profile.tries_after_contest += 1
-        else:
-            if not is_upsolving:
-                contest_user_task_profile.points = max(
-                    contest_user_task_profile.points,
-                    contest_submission.submission.points)
-                contest_user_task_profile.tries += 1
-            else:
-                contest_user_task_profile.points_after_contest = max(
-                    contest_user_task_profile.points_after_contest,
-                    contest_submission.submission.points)
-                contest_user_task_profile.tries += 1
-    contest_user_task_profile.save()
-    if contest.is_started:
-        if not contest.is_ioi_style:
-            if not is_upsolving:
-                # update user profile
-                user_profile.solved_count = user_profile.contestusertaskprofile_set.filter(
-                    solved=True).count()
-                user_profile.penalty = \
-                    user_profile.contestusertaskprofile_set.aggregate(
-                        Sum('penalty'), )['penalty__sum']
-            else:
-                # update user profile
-                user_profile.solved_count_after_contest = \
-                    user_profile.contestusertaskprofile_set.filter(
-                        solved_after_contest=True).count()
-        else:
-            if not is_upsolving:
-                user_profile.points = \
-                    user_profile.contestusertaskprofile_set.aggregate(
-                        Sum('points'))['points__sum']
-            else:
-                user_profile.points_after_contest = \
-                    user_profile.contestusertaskprofile_set.aggregate(
-                        Sum('points_after_contest'))[
-                        'points_after_contest__sum']
-    user_profile.save()
+    """
+    Applies verdict of judged contest submission to profiles of user. Task
+    profile is locked and totals of user profile are changed with atomic
+    updates, so concurrent verdicts of user do not lose changes. Every
+    submission is applied once.
+    """
+    with transaction.atomic():
+        contest_submission = ContestUserSubmission.objects.select_for_update(
+        ).get(pk=contest_submission_id)
+        if contest_submission.processed:
+            return
+        contest_user_task_profile = \
+            ContestUserTaskProfile.objects.select_for_update().get(
+                pk=contest_submission.user_task_profile_id)
+        deltas = apply_verdict(contest_submission.contest,
+                               contest_user_task_profile, contest_submission)
+        contest_user_task_profile.save()
+        deltas = {name: F(name) + delta for name, delta in deltas.items()
+                  if delta}
+        if deltas:
+            ContestUserProfile.objects.filter(
+                pk=contest_submission.user_profile_id).update(
+                updated_at=timezone.now(), **deltas)
+        contest_submission.processed = True
+        contest_submission.save(update_fields=['processed', 'updated_at'])
+    update_standings_row(ContestUserProfile.objects.get(
+        pk=contest_submission.user_profile_id))
+
+
+@app.task()
+def check_contest_scores(contest_id):
+    """
+    Recomputes task profiles and user profiles of contest from processed
+    submissions and fixes ones that differ.
+    :return count of fixed profiles.
+    """
+    contest = Contest.objects.get(pk=contest_id)
+    with transaction.atomic():
+        # process_submission waits until check is done
+        task_profiles = list(ContestUserTaskProfile.objects.filter(
+            contest=contest).select_for_update())
+        user_profiles = list(ContestUserProfile.objects.filter(
+            contest=contest).select_for_update())
+        expected_task_profiles = {
+            task_profile.pk: ContestUserTaskProfile(
+                pk=task_profile.pk, contest=contest,
+                user_profile_id=task_profile.user_profile_id,
+                task_id=task_profile.task_id)
+            for task_profile in task_profiles}
+        expected_totals = {user_profile.pk: dict.fromkeys(
+            user_profile_totals, 0) for user_profile in user_profiles}
+        for contest_submission in ContestUserSubmission.objects.filter(
+                contest=contest, processed=True).select_related(
+            'submission').order_by('created_at', 'pk'):
+            deltas = apply_verdict(
+                contest,
+                expected_task_profiles[contest_submission.user_task_profile_id],
+                contest_submission)
+            for name, delta in deltas.items():
+                expected_totals[contest_submission.user_profile_id][
+                    name] += delta
+
+        wrong_task_profiles = []
+        for task_profile in task_profiles:
+            expected = expected_task_profiles[task_profile.pk]
+            if any(getattr(task_profile, name) != getattr(expected, name)
+                   for name in task_profile_fields):
+                for name in task_profile_fields:
+                    setattr(task_profile, name, getattr(expected, name))
+                wrong_task_profiles.append(task_profile)
+        wrong_user_profiles = []
+        for user_profile in user_profiles:
+            expected = expected_totals[user_profile.pk]
+            # penalty is float, sums in other order may differ a bit
+            if any(abs(getattr(user_profile, name) - expected[name]) > 1e-6
+                   for name in user_profile_totals):
+                for name in user_profile_totals:
+                    setattr(user_profile, name, expected[name])
+                wrong_user_profiles.append(user_profile)
+        ContestUserTaskProfile.objects.bulk_update(wrong_task_profiles,
+                                                   task_profile_fields)
+        ContestUserProfile.objects.bulk_update(wrong_user_profiles,
+                                               user_profile_totals)
+    fixed_count = len(wrong_task_profiles) + len(wrong_user_profiles)
+    print(f'Contest {contest_id} scores checked, {fixed_count} profiles fixed')
+    if fixed_count:
+        invalidate_standings(contest_id)
+    return fixed_count
+
+
+@app.task()
+def unfreeze_standings(contest_id):
+    """
+    Publishes real standings of frozen contest. Verdicts received during
+    freeze are already applied to profiles, they are replayed once more with
+    all other submissions by check_contest_scores, so standings are opened
+    after one batch computation.
+    """
+    check_contest_scores(contest_id)
+    Contest.objects.filter(pk=contest_id).update(is_frozen=False,
+                                                 updated_at=timezone.now())
+    delete_standings_snapshot(contest_id)
+    invalidate_standings(contest_id)
@@ -15,12 +15,21 @@ urlpatterns = [
          name='contester.views.view_contest_task'),
     path('contest/<int:contest_id>/submission/<int:pk>/', views.submission,
          name='contester.views.view_submission'),
+    path('contest/<int:contest_id>/submission/<int:pk>/progress/',
+         views.submission_progress,
+         name='contester.views.submission_progress'),
     path('contest/<int:contest_id>/my_submissions/', views.my_submissions,
          name='contester.views.my_submissions'),
+    path('contest/<int:contest_id>/my_submissions/events/',
+         views.my_submissions_events,
+         name='contester.views.my_submissions_events'),
     path('contest/<int:contest_id>/submissions/', views.contest_submissions,
          name='contester.views.contest_submissions'),
     path('contest/<int:contest_id>/standings/', views.contest_standings,
          name='contester.views.contest_standings'),
+    path('contest/<int:contest_id>/standings/events/',
+         views.contest_standings_events,
+         name='contester.views.contest_standings_events'),
 
     # Manage Contest
     path('manage/contest/', views.manage_contests,
@@ -53,6 +62,10 @@ urlpatterns = [
          name='contester.views.start_contest', ),
     path('manage/contest/<int:pk>/panel/stop/', views.stop_contest,
          name='contester.views.stop_contest', ),
+    path('manage/contest/<int:pk>/panel/check_scores/', views.check_scores,
+         name='contester.views.check_scores', ),
+    path('manage/contest/<int:pk>/panel/unfreeze/', views.unfreeze_contest,
+         name='contester.views.unfreeze_contest', ),
     # Manage Contest Task
     path('manage/contest/<int:pk>/task/', views.manage_contest_tasks,
          name='contester.views.manage_contest_tasks'),
@@ -5,6 +5,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 
 from contester.models import Contest
+from contester.standings import delete_standings_snapshot
+from contester.tasks import check_contest_scores, \
+    schedule_contest_status_update, unfreeze_standings
 
 
 @staff_member_required
@@ -22,6 +25,7 @@ def launch_contest(request, pk):
     contest = get_object_or_404(Contest, pk=pk)
     contest.is_launched = True
     contest.save()
+    schedule_contest_status_update(contest)
     messages.success(request, f'Contest "{contest.name}" launched')
     return redirect('contester.views.contest_control_panel', pk=contest.pk)
 
@@ -33,7 +37,10 @@ def abort_contest(request, pk):
     contest.is_launched = False
     contest.is_ended = False
     contest.is_started = False
+    contest.is_frozen = False
+    contest.frozen_at = None
     contest.save()
+    delete_standings_snapshot(contest.pk)
     messages.success(request, f'Contest "{contest.name}" Aborted!')
     return redirect('contester.views.contest_control_panel', pk=contest.pk)
 
@@ -44,6 +51,7 @@ def start_contest(request, pk):
     contest = get_object_or_404(Contest, pk=pk)
     contest.start_date_time = timezone.now()
     contest.save()
+    schedule_contest_status_update(contest)
     messages.success(request, f'Contest "{contest.name}" started')
     return redirect('contester.views.contest_control_panel', pk=contest.pk)
 
@@ -56,3 +64,23 @@ def stop_contest(request, pk):
     contest.save()
     messages.success(request, f'Contest "{contest.name}" ended')
     return redirect('contester.views.contest_control_panel', pk=contest.pk)
+
+
+@staff_member_required
+@login_required
+def check_scores(request, pk):
+    contest = get_object_or_404(Contest, pk=pk)
+    check_contest_scores.delay(contest.pk)
+    messages.success(request, f'Scores of contest "{contest.name}" will be '
+                              f'recomputed from submissions')
+    return redirect('contester.views.contest_control_panel', pk=contest.pk)
+
+
+@staff_member_required
+@login_required
+def unfreeze_contest(request, pk):
+    contest = get_object_or_404(Contest, pk=pk)
+    unfreeze_standings.delay(contest.pk)
+    messages.success(request, f'Standings of contest "{contest.name}" will be '
+                              f'unfrozen')
+    return redirect('contester.views.contest_control_panel', pk=contest.pk)
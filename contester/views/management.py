@@ -11,6 +11,8 @@ from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render, redirect, get_object_or_404
 
 from contester.models import Contest, ContestTask, ContestUserProfile
+from contester.standings import invalidate_standings
+from contester.tasks import schedule_contest_status_update
 from polygon.models import Problem
 from utils import reorder_models_indexes
 
@@ -52,7 +54,7 @@ class ManageContestForm(forms.ModelForm):
     class Meta:
         model = Contest
         fields = ('name', 'is_ioi_style', 'start_date_time', 'is_public',
-                  'duration')
+                  'duration', 'freeze_duration')
 
 
 @staff_member_required()
@@ -63,6 +65,8 @@ def manage_contest(request, pk):
     if request.method == 'POST':
         if form.is_valid():
             form.save()
+            # start time or duration may be changed
+            schedule_contest_status_update(contest)
             messages.success(request, f'Contest "{contest.name}" saved')
     return render(request, 'contester/contest/manage/manage_contest.html',
                   context={
@@ -98,6 +102,7 @@ def delete_registered_user(request, contest_id, pk):
         if form.is_valid():
             if form.cleaned_data['name'] == user_profile.user.username:
                 contest_user_profile.delete()
+                invalidate_standings(contest.pk)
                 messages.success(request,
                                  f'User "{contest_user_profile.user}" deleted '
                                  f'from contest "{contest.name}"')
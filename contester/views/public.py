@@ -3,15 +3,38 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import HttpResponseForbidden, HttpResponseBadRequest
+from django.http import HttpResponseForbidden, HttpResponseBadRequest, \
+    JsonResponse, Http404, StreamingHttpResponse, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 
 from contester.judge import judge_contest_submission
 from contester.models import *
+from contester.standings import get_frozen_standings, get_standings, \
+    standings_key
 from polygon.models import Statement
+from polygon.progress import format_event, get_submission_state, \
+    open_event_stream, progress_key, registered_events, stream_events
 
 
 # Checks and utils
+def event_stream_response(events):
+    """
+    :return response streaming events or 503 if there are too many open
+    streams, pages fall back to reloading then.
+    """
+    stream_id = open_event_stream()
+    if stream_id is None:
+        response = HttpResponse('Too many event streams', status=503)
+        response['Retry-After'] = 60
+        return response
+    response = StreamingHttpResponse(registered_events(events, stream_id),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx must not buffer events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def check_contest_started(func):
     def wrapper_check_contest_started(request, contest_id, *args, **kwargs):
         contest = get_object_or_404(Contest, pk=contest_id)
@@ -104,9 +127,12 @@ def submission(request, contest_id, pk):
     contest_submission = get_object_or_404(ContestUserSubmission, pk=pk,
                                            contest=contest)
     show_data = True if request.user.is_staff or contest_submission.user_profile.user == request.user else False
+    # verdicts of others would reveal frozen standings
+    hide_verdict = contest.is_frozen and not show_data
     return render(request, 'contester/contest/submission.html', context={
         'contest': contest,
         'contest_submission': contest_submission,
+        'hide_verdict': hide_verdict,
         'test_group_results': contest_submission.submission.submissiontestgroupresult_set.order_by(
             'test_group__index'),
         'test_results': contest_submission.submission.submissiontestresult_set.order_by(
@@ -116,6 +142,30 @@ def submission(request, contest_id, pk):
     })
 
 
+@login_required
+@check_contest_started
+def submission_progress(request, contest_id, pk):
+    """
+    Current judging state of submission as json, only for its owner and
+    staff. It is polled while submission is tested, so it is taken from
+    judging progress in redis and only contest submission is looked up in
+    database.
+    """
+    contest_submissions = ContestUserSubmission.objects.filter(
+        pk=pk, contest_id=contest_id)
+    if not request.user.is_staff:
+        contest_submissions = contest_submissions.filter(
+            user_profile__user=request.user)
+    submission_id = contest_submissions.values_list('submission_id',
+                                                    flat=True).first()
+    state = None
+    if submission_id is not None:
+        state = get_submission_state(submission_id)
+    if state is None:
+        raise Http404('Submission not found')
+    return JsonResponse(state)
+
+
 @login_required
 @check_contest_started
 def my_submissions(request, contest_id):
@@ -124,13 +174,47 @@ def my_submissions(request, contest_id):
             contest=contest).exists():
         return HttpResponseForbidden('You are not registered to contest')
     user_profile = request.user.contestuserprofile_set.get(contest=contest)
+    contest_submissions = user_profile.contestusersubmission_set.order_by(
+        '-pk').select_related('submission', 'task', 'user_profile__user')
     return render(request, 'contester/contest/my_submissions.html', context={
         'contest': contest,
-        'contest_submissions': user_profile.contestusersubmission_set.order_by('-pk'),
+        'contest_submissions': contest_submissions,
+        # verdicts are pushed while there are submissions in judging
+        'has_untested': any(not contest_submission.submission.tested
+                            for contest_submission in contest_submissions),
         'Submission': Submission
     })
 
 
+@login_required
+@check_contest_started
+def my_submissions_events(request, contest_id):
+    """
+    Server-sent events with judging progress of user submissions that are
+    not tested yet, stream ends when all of them are tested.
+    """
+    contest = get_object_or_404(Contest, pk=contest_id)
+    user_profile = request.user.contestuserprofile_set.filter(
+        contest=contest).first()
+    if user_profile is None:
+        return HttpResponseForbidden('You are not registered to contest')
+    pending = set(user_profile.contestusersubmission_set.filter(
+        submission__tested=False).values_list('submission_id', flat=True))
+    if not pending:
+        return event_stream_response([format_event({'end': True})])
+
+    def is_finished(state):
+        if state.get('tested'):
+            pending.discard(state['submission'])
+        return not pending
+
+    return event_stream_response(stream_events(
+        [progress_key(submission_id) for submission_id in pending],
+        (get_submission_state(submission_id)
+         for submission_id in list(pending)),
+        is_finished))
+
+
 @check_contest_started
 def contest_submissions(request, contest_id):
     contest = get_object_or_404(Contest, pk=contest_id)
@@ -145,6 +229,9 @@ def contest_submissions(request, contest_id):
                   context={
                       'contest': contest,
                       'contest_submissions': paginator.get_page(page),
+                      # verdicts of others would reveal frozen standings
+                      'hide_verdicts': contest.is_frozen and
+                                       not request.user.is_staff,
                       'Submission': Submission,
                       'previous_page': page - 1 if page >= 1 else None,
                       'next_page': page + 1 if page + 1 <= paginator.num_pages else None
@@ -154,27 +241,55 @@ def contest_submissions(request, contest_id):
 @check_contest_started
 def contest_standings(request, contest_id):
     contest = get_object_or_404(Contest, pk=contest_id)
+    tasks = list(contest.get_tasks())
 
-    upsolving_user_profiles = None
-    if not contest.is_ioi_style:
-        user_profiles = contest.contestuserprofile_set.order_by('-solved_count',
-                                                                'penalty').exclude(solved_count=0)
-        if contest.is_ended:
-            upsolving_user_profiles = contest.contestuserprofile_set.order_by(
-                '-solved_count_after_contest').exclude(solved_count_after_contest=0)
+    # rows are taken from standings cache (see contester/standings.py)
+    is_frozen = contest.is_frozen and not (request.user.is_staff and
+                                           'live' in request.GET)
+    if is_frozen:
+        paginator = Paginator(get_frozen_standings(contest, tasks), 100)
     else:
-        user_profiles = contest.contestuserprofile_set.order_by('points').exclude(points=0)
-        if contest.is_ended:
-            upsolving_user_profiles = contest.contestuserprofile_set.order_by(
-                '-points_after_contest').exclude(points_after_contest=0)
+        paginator = Paginator(get_standings(contest, tasks), 100)
+    page = int(request.GET.get('page')) if str(
+        request.GET.get('page')).isnumeric() else 1
+    # upsolving standings are paginated separately
+    upsolving_page = int(request.GET.get('upsolving_page')) if str(
+        request.GET.get('upsolving_page')).isnumeric() else 1
+    upsolving_rows = None
+    upsolving_next_page = None
+    if contest.is_ended:
+        upsolving_paginator = Paginator(get_standings(contest, tasks, True),
+                                        100)
+        upsolving_rows = upsolving_paginator.get_page(upsolving_page)
+        if upsolving_page + 1 <= upsolving_paginator.num_pages:
+            upsolving_next_page = upsolving_page + 1
 
     return render(request, 'contester/contest/standings.html', context={
         'contest': contest,
-        'user_profiles': user_profiles,
-        'upsolving_user_profiles': upsolving_user_profiles,
+        'tasks': tasks,
+        'is_frozen': is_frozen,
+        'rows': paginator.get_page(page),
+        'upsolving_rows': upsolving_rows,
+        'page': page,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if page + 1 <= paginator.num_pages else None,
+        'upsolving_page': upsolving_page,
+        'upsolving_previous_page': upsolving_page - 1 if upsolving_page > 1
+        else None,
+        'upsolving_next_page': upsolving_next_page
     })
 
 
+@check_contest_started
+def contest_standings_events(request, contest_id):
+    """
+    Server-sent events with changed standings rows, see
+    contester/standings.py.
+    """
+    return event_stream_response(
+        stream_events([standings_key(contest_id, 'events')]))
+
+
 class SubmitForm(forms.Form):
     submission_type = forms.ChoiceField(required=True,
                                         choices=Submission.SUBMISSION_TYPES)
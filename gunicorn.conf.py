@@ -0,0 +1,22 @@
+"""
+Gunicorn config of web server.
+
+Server-sent event streams (see polygon/progress.py) are open for minutes,
+so requests are served by gevent workers: a stream waiting for redis holds
+a greenlet instead of a whole worker process.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+worker_class = 'gevent'
+# open connections of one worker, event streams included
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# event streams send keep-alive comment every 15 seconds
+timeout = 60
+
+
+def post_fork(server, worker):
+    # psycopg2 does not block other greenlets while waiting for database
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -0,0 +1,79 @@
+import hashlib
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import get_storage_class
+
+
+class BlobStore:
+    """
+    Content addressed store of test data.
+
+    Blobs are stored as `{key[:2]}/{key}` in django storage, where key is
+    sha256 of content, so equal tests are stored once and blob of key never
+    changes. Storage is TEST_BLOB_STORAGE, local filesystem by default, any
+    django storage (e.g. S3 one of django-storages) works as well. Web and
+    workers must use the same storage.
+
+    Blobs are never removed here, tests only reference them by key.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def name(key: str) -> str:
+        return f'{key[:2]}/{key}'
+
+    def put(self, content):
+        """
+        :param content: bytes, str, django File (e.g. uploaded file) or any
+        binary file object, files are read in chunks.
+        :return key and size of content.
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        if isinstance(content, bytes):
+            content = ContentFile(content)
+        if not isinstance(content, File):
+            return self.put_stream(content)
+        h = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            h.update(chunk)
+            size += len(chunk)
+        key = h.hexdigest()
+        if not self.storage.exists(self.name(key)):
+            self.storage.save(self.name(key), content)
+        return key, size
+
+    def put_stream(self, stream):
+        """
+        Puts content of file object that can be read only once (e.g. entry
+        of archive), it is spooled to temporary file while hashed.
+        :return key and size of content.
+        """
+        h = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile() as f:
+            for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            key = h.hexdigest()
+            if not self.storage.exists(self.name(key)):
+                f.seek(0)
+                self.storage.save(self.name(key), File(f))
+        return key, size
+
+    def open(self, key: str):
+        return self.storage.open(self.name(key), 'rb')
+
+    def read(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+
+blob_store = BlobStore(get_storage_class(settings.TEST_BLOB_STORAGE)(
+    location=settings.TEST_BLOB_STORAGE_LOCATION))
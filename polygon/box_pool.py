@@ -0,0 +1,100 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .execution import remove_tree, run
+from .file_cache import remove_file
+
+
+class BoxPool:
+    """
+    Keeps isolate boxes of this worker initialized, so tests do not pay for
+    `isolate --cg --init` and `isolate --cleanup --cg` every run.
+
+    Isolate allows many runs in one initialized box (control group counters
+    are reset on every run). Between tests of one submission only writable
+    directories are cleaned (see reset). When submission is judged boxes are
+    released and recycled (full cleanup + init) in background thread, so
+    next submission gets fresh boxes without waiting for it.
+
+    Pool is lazy and per process: celery forks worker processes after
+    import, threads do not survive fork.
+    """
+
+    def __init__(self, box_ids):
+        self.box_ids = list(box_ids)
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.ready = queue.Queue()
+            self.recycler = ThreadPoolExecutor(max_workers=1)
+            for box_id in self.box_ids:
+                self.recycler.submit(self._recycle, box_id)
+
+    @staticmethod
+    def box_path(box_id):
+        return os.path.join(settings.JUDGE_ISOLATE_BOX_ROOT, str(box_id),
+                            'box')
+
+    def _recycle(self, box_id):
+        # box is returned to pool anyway, if init failed runs in this box
+        # fail and task is retried.
+        try:
+            run(['isolate', f'--box-id={box_id}', '--cleanup', '--cg'],
+                capture_output=True)
+            cp = run(['isolate', f'--box-id={box_id}', '--cg', '--init'],
+                     capture_output=True)
+            if cp.returncode != 0:
+                print(f'FAILED to init isolate box {box_id}: '
+                      f'{cp.stderr.decode()}')
+        except OSError as e:
+            print(f'FAILED to init isolate box {box_id}: {e}')
+        finally:
+            self.ready.put(box_id)
+
+    def acquire(self, count=1):
+        """
+        :return list of `count` initialized box ids, waits for recycling
+        boxes if needed.
+        """
+        self._ensure_started()
+        count = max(1, min(count, len(self.box_ids)))
+        return [self.ready.get() for _ in range(count)]
+
+    def release(self, box_ids):
+        for box_id in box_ids:
+            self.recycler.submit(self._recycle, box_id)
+
+    @staticmethod
+    def reset(box_id, usercode_path, keep=()):
+        """
+        Cleans writable directories between runs: isolate box directory and
+        usercode folder of sandbox, except files from keep, so nothing
+        written by previous test is seen by next one.
+        """
+        for path, exclude in ((BoxPool.box_path(box_id), ()),
+                              (usercode_path, keep)):
+            try:
+                names = os.listdir(path)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if name in exclude:
+                    continue
+                entry = os.path.join(path, name)
+                if os.path.isdir(entry) and not os.path.islink(entry):
+                    remove_tree(entry)
+                else:
+                    remove_file(entry)
+
+
+box_pool = BoxPool(range(settings.JUDGE_FIRST_BOX_ID,
+                         settings.JUDGE_FIRST_BOX_ID + settings.JUDGE_BOX_COUNT))
@@ -0,0 +1,161 @@
+"""
+Built-in checkers.
+
+Most problems need only a standard checker, so instead of starting compiled
+testlib checker for every test output is compared with answer in judge
+process. Files are read in chunks, so large outputs are not loaded in
+memory. Return codes are the same as testlib ones.
+"""
+import math
+import re
+
+from .models import Problem
+
+# testlib return codes
+OK = 0
+WA = 1
+PE = 2
+FAIL = 3
+
+chunk_size = 64 * 1024
+
+# numbers accepted by readDouble of testlib, python float() also takes
+# e.g. '1_0', 'inf', 'nan' and surrounding whitespace
+float_pattern = re.compile(rb'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+
+
+def compare_exact(output_path, answer_path):
+    with open(output_path, 'rb') as output, open(answer_path, 'rb') as answer:
+        position = 0
+        while True:
+            output_chunk = output.read(chunk_size)
+            answer_chunk = answer.read(chunk_size)
+            if output_chunk != answer_chunk:
+                for i in range(min(len(output_chunk), len(answer_chunk))):
+                    if output_chunk[i] != answer_chunk[i]:
+                        break
+                else:
+                    i = min(len(output_chunk), len(answer_chunk))
+                return WA, f'files differ at byte {position + i + 1}'
+            if not output_chunk:
+                return OK, f'{position} bytes are equal'
+            position += len(output_chunk)
+
+
+def read_tokens(f):
+    """
+    Yields whitespace separated tokens (bytes) of file.
+    """
+    rest = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        tokens = (rest + chunk).split()
+        # last token can continue in next chunk
+        if tokens and not chunk[-1:].isspace():
+            rest = tokens.pop()
+        else:
+            rest = b''
+        yield from tokens
+    if rest:
+        yield rest
+
+
+def shorten(token):
+    token = token.decode(errors='replace')
+    return token if len(token) <= 64 else token[:61] + '...'
+
+
+def compare_tokens(output_path, answer_path, compare_token):
+    """
+    Compares files token by token, compare_token(expected, found) returns
+    None if tokens are equal and (code, message) otherwise.
+    """
+    with open(output_path, 'rb') as output, open(answer_path, 'rb') as answer:
+        output_tokens = read_tokens(output)
+        count = 0
+        for expected in read_tokens(answer):
+            found = next(output_tokens, None)
+            count += 1
+            if found is None:
+                return WA, f'participant output contains only {count - 1} ' \
+                           f'tokens, answer contains more'
+            verdict = compare_token(expected, found)
+            if verdict is not None:
+                return verdict[0], f'{count} token: {verdict[1]}'
+        if next(output_tokens, None) is not None:
+            return WA, f'participant output contains more than {count} tokens'
+        return OK, f'{count} tokens'
+
+
+def compare_words(expected, found):
+    if expected != found:
+        return WA, f'expected: \'{shorten(expected)}\', ' \
+                   f'found: \'{shorten(found)}\''
+    return None
+
+
+def parse_float(token):
+    """
+    :return value of token or None if testlib does not accept it as a
+    number (infinite values included).
+    """
+    if float_pattern.fullmatch(token) is None:
+        return None
+    value = float(token)
+    if math.isinf(value):
+        return None
+    return value
+
+
+def float_equal(expected, found, epsilon):
+    """
+    Same as doubleCompare of testlib: absolute or relative error is at most
+    epsilon.
+    """
+    if math.isnan(expected) or math.isnan(found):
+        return math.isnan(expected) and math.isnan(found)
+    if math.isinf(expected) or math.isinf(found):
+        return expected == found
+    if abs(found - expected) <= epsilon + 1e-15:
+        return True
+    low = min(expected * (1 - epsilon), expected * (1 + epsilon))
+    high = max(expected * (1 - epsilon), expected * (1 + epsilon))
+    return low - 1e-15 <= found <= high + 1e-15
+
+
+def float_token_comparator(epsilon):
+    def compare(expected, found):
+        expected_value = parse_float(expected)
+        if expected_value is None:
+            return FAIL, f'answer is not a number: \'{shorten(expected)}\''
+        found_value = parse_float(found)
+        if found_value is None:
+            return PE, f'expected number, found: \'{shorten(found)}\''
+        if not float_equal(expected_value, found_value, epsilon):
+            return WA, f'expected: {expected_value}, found: {found_value}, ' \
+                       f'error is more than {epsilon}'
+        return None
+
+    return compare
+
+
+def run_builtin_checker(problem, output_path, answer_path):
+    """
+    :return (return code, message) of built-in checker of problem.
+    """
+    try:
+        if problem.checker_type == Problem.EXACT_CHECKER:
+            return compare_exact(output_path, answer_path)
+        if problem.checker_type == Problem.TOKENS_CHECKER:
+            return compare_tokens(output_path, answer_path, compare_words)
+        if problem.checker_type == Problem.FLOAT_CHECKER:
+            return compare_tokens(
+                output_path, answer_path,
+                float_token_comparator(problem.checker_epsilon))
+    except FileNotFoundError as e:
+        if e.filename == output_path:
+            return PE, 'participant output not found'
+        return FAIL, f'file not found: {e.filename}'
+    return FAIL, f'unknown checker type {problem.checker_type}'
@@ -0,0 +1,116 @@
+"""
+Compilation of submissions.
+
+Submissions are compiled by compile_submission_task on separate
+`compilation` queue before judging, so compilation does not hold judging
+worker. Result is stored as CompilationArtifact keyed by hash of submission
+type, source and flags, and judging worker takes binary from its local cache
+or from database. Identical resubmissions and rejudges are never compiled
+again.
+"""
+import os
+import subprocess
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .execution import make_dirs, open_new_file, run
+from .file_cache import FileCache
+from .models import CompilationArtifact, Submission
+from .precompiled_headers import stdcpp_include_flags
+
+submission_compilation_flags = '-std=c++17 -static -lm -s -x c++ -W -O2'
+
+compilation_timeout = 10
+
+# Compiled submissions of this worker, key is the same as artifact key.
+submission_cache = FileCache(
+    os.path.join(settings.JUDGE_CACHE_DIR, 'submissions'),
+    settings.JUDGE_ARTIFACT_CACHE_SIZE)
+
+
+def needs_compilation(submission):
+    return submission.submission_type == Submission.CPP17
+
+
+def compilation_key(submission):
+    return FileCache.key(submission.submission_type, submission.data,
+                         submission_compilation_flags)
+
+
+def compile_cpp17(path, source):
+    """
+    Compiles source in folder `path` to `{path}/usercode/submission`.
+    :return (CompilationArtifact (not saved), cacheable), cacheable is False
+    if compilation failed because of environment (e.g. timeout on busy
+    worker), not because of compiler result.
+    """
+    make_dirs(f'{path}/usercode')
+    with open(f'{path}/submission.cpp', 'w') as f:
+        f.write(source)
+    artifact = CompilationArtifact()
+    try:
+        # dummy is a user that can access only some temp folder
+        cp = run(['g++', *submission_compilation_flags.split(),
+                  *stdcpp_include_flags(submission_compilation_flags), '-o',
+                  'usercode/submission', 'submission.cpp'],
+                 user='dummy', capture_output=True, cwd=path,
+                 timeout=compilation_timeout)  # if too long then its bad
+    except subprocess.TimeoutExpired:
+        artifact.log = 'Compilation took too long'
+        return artifact, False
+    if cp.returncode != 0:
+        artifact.log = cp.stdout.decode() + '\n' + cp.stderr.decode()
+        return artifact, True
+    artifact.succeeded = True
+    with open(f'{path}/usercode/submission', 'rb') as f:
+        artifact.binary = f.read()
+    return artifact, True
+
+
+def get_or_compile_artifact(submission, path):
+    """
+    :return CompilationArtifact of submission, if there is none submission
+    is compiled in folder `path` and artifact is saved (only if result came
+    from compiler, failures of environment are never cached).
+    """
+    key = compilation_key(submission)
+    artifact = CompilationArtifact.objects.filter(key=key).first()
+    if artifact is not None:
+        CompilationArtifact.objects.filter(pk=artifact.pk).update(
+            used_at=timezone.now())
+        return artifact
+    artifact, cacheable = compile_cpp17(path, submission.data)
+    artifact.key = key
+    if not cacheable:
+        return artifact
+    try:
+        artifact.save()
+    except IntegrityError:
+        # compiled by another worker at the same time
+        pass
+    return artifact
+
+
+def put_submission_binary(submission, path):
+    """
+    Puts compiled submission to `{path}/usercode/submission` from local
+    cache or database, compiles it in folder `path` if it was not compiled.
+    :return None on success, otherwise CompilationArtifact of failed
+    compilation.
+    """
+    destination = f'{path}/usercode/submission'
+    key = compilation_key(submission)
+    # usercode is writable from sandbox, so files there are always created
+    # anew (never written through whatever is at their path)
+    if submission_cache.copy(key, destination):
+        print('Submission taken from compilation cache.')
+        return None
+    artifact = get_or_compile_artifact(submission, path)
+    if not artifact.succeeded:
+        return artifact
+    submission_cache.put_data(key, artifact.binary)
+    with open_new_file(destination, 0o755) as f:
+        f.write(artifact.binary)
+    return None
@@ -0,0 +1,189 @@
+"""
+Shell free execution helpers for judge.
+
+File operations are done in-process and binaries are started directly with
+argv lists and file descriptors, so no `/bin/sh` (and no `cp`, `chmod`,
+`rm`, `tee`, ...) process is spawned for every step of judging.
+"""
+import os
+import pwd
+import shutil
+import subprocess
+import tempfile
+import time
+from stat import S_ISDIR, S_ISLNK
+
+
+def make_dirs(path):
+    os.makedirs(path, exist_ok=True)
+
+
+def copy_tree(source, destination):
+    """
+    Copies content of source folder to destination folder (created if
+    needed) preserving permissions, like `cp -rp source/* destination`.
+    """
+    make_dirs(destination)
+    shutil.copystat(source, destination)
+    for name in os.listdir(source):
+        source_path = os.path.join(source, name)
+        destination_path = os.path.join(destination, name)
+        if os.path.isdir(source_path) and not os.path.islink(source_path):
+            copy_tree(source_path, destination_path)
+        else:
+            shutil.copy2(source_path, destination_path, follow_symlinks=False)
+
+
+def chmod_tree(path, mode):
+    """
+    Same as `chmod -R mode path`, but symlinks and files with more than one
+    hardlink (e.g. entries of worker file caches) are never changed, only
+    files that belong to the tree are.
+    """
+    os.chmod(path, mode)
+    for directory, folders, files in os.walk(path):
+        for name in folders + files:
+            entry = os.path.join(directory, name)
+            stat = os.lstat(entry)
+            if S_ISLNK(stat.st_mode) or \
+                    (not S_ISDIR(stat.st_mode) and stat.st_nlink > 1):
+                continue
+            os.chmod(entry, mode)
+
+
+def open_new_file(path, mode=0o644):
+    """
+    :return file object of new file `path` opened for binary writing.
+    Existing file is removed first and new one is created with
+    O_EXCL | O_NOFOLLOW, so a symlink planted at path (e.g. by submission
+    in usercode) is never followed.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW,
+                 mode)
+    # umask is applied on creation
+    os.fchmod(fd, mode)
+    return open(fd, 'wb')
+
+
+def copy_file(source, destination):
+    """
+    Copies content and permission bits of source to new file destination
+    (see open_new_file).
+    """
+    with open(source, 'rb') as source_file:
+        mode = os.fstat(source_file.fileno()).st_mode & 0o777
+        with open_new_file(destination, mode) as destination_file:
+            shutil.copyfileobj(source_file, destination_file, 1024 * 1024)
+
+
+def make_executable(path):
+    os.chmod(path, os.stat(path).st_mode | 0o111)
+
+
+def remove_tree(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _as_user(argv, user):
+    """
+    :return argv that executes given argv as given user via setpriv.
+    preexec_fn with setuid is not safe in threaded worker processes (and
+    subprocess got user and group arguments only in python 3.9).
+    """
+    entry = pwd.getpwnam(user)
+    return ['setpriv', '--reuid', str(entry.pw_uid),
+            '--regid', str(entry.pw_gid), '--clear-groups', '--'] + list(argv)
+
+
+def run(argv, stdin=None, stdout=None, stderr=None, cwd=None, timeout=None,
+        user=None, capture_output=False) -> subprocess.CompletedProcess:
+    """
+    Runs argv without shell.
+    stdin, stdout and stderr are paths of files to redirect to, if
+    capture_output is True not redirected streams are captured.
+    If user is given process is executed as that user.
+    Returned stdout and stderr are always bytes (empty if not captured).
+    """
+    files = []
+    kwargs = {}
+    try:
+        for name, path, flags in (('stdin', stdin, 'rb'),
+                                  ('stdout', stdout, 'wb'),
+                                  ('stderr', stderr, 'wb')):
+            if path is not None:
+                f = open(path, flags)
+                files.append(f)
+                kwargs[name] = f
+            elif capture_output and name != 'stdin':
+                kwargs[name] = subprocess.PIPE
+        if user is not None:
+            argv = _as_user(argv, user)
+        cp = subprocess.run(argv, cwd=cwd, timeout=timeout, **kwargs)
+    finally:
+        for f in files:
+            f.close()
+    if cp.stdout is None:
+        cp.stdout = b''
+    if cp.stderr is None:
+        cp.stderr = b''
+    return cp
+
+
+def run_interactive(interactor_argv, solution_argv, cwd=None, timeout=None):
+    """
+    Runs interactor and solution connected with two pipes: output of one is
+    input of another. stderr of both is captured.
+    :raise subprocess.TimeoutExpired if both did not finish in timeout.
+    :return (interactor, solution) completed processes.
+    """
+    to_solution_read, to_solution_write = os.pipe()
+    to_interactor_read, to_interactor_write = os.pipe()
+    interactor_stderr = tempfile.TemporaryFile()
+    solution_stderr = tempfile.TemporaryFile()
+    processes = []
+
+    def kill_all():
+        for process in processes:
+            process.kill()
+            process.wait()
+
+    try:
+        try:
+            processes.append(subprocess.Popen(interactor_argv, cwd=cwd,
+                                              stdin=to_interactor_read,
+                                              stdout=to_solution_write,
+                                              stderr=interactor_stderr))
+            processes.append(subprocess.Popen(solution_argv, cwd=cwd,
+                                              stdin=to_solution_read,
+                                              stdout=to_interactor_write,
+                                              stderr=solution_stderr))
+        except OSError:
+            kill_all()
+            raise
+        finally:
+            # children have their copies, otherwise nobody gets EOF
+            for fd in (to_solution_read, to_solution_write,
+                       to_interactor_read, to_interactor_write):
+                os.close(fd)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            for process in processes:
+                process.wait(timeout=None if deadline is None else
+                             max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            kill_all()
+            raise
+        results = []
+        for process, stderr_file in zip(processes, (interactor_stderr,
+                                                    solution_stderr)):
+            stderr_file.seek(0)
+            results.append(subprocess.CompletedProcess(
+                process.args, process.returncode, b'', stderr_file.read()))
+    finally:
+        interactor_stderr.close()
+        solution_stderr.close()
+    return results[0], results[1]
@@ -0,0 +1,180 @@
+import fcntl
+import hashlib
+import os
+import secrets
+import shutil
+
+from .execution import copy_file
+
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def remove_file(path: str):
+    """
+    Removes file if it exists. Files are removed before they are written,
+    so write never follows what is left at their path.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class FileCache:
+    """
+    Content addressed file cache on worker disk.
+
+    Files are stored as `{root}/{key[:2]}/{key}` where key is a sha256 of
+    whatever identifies content (source code, compiler flags and so on, see
+    FileCache.key). Cache is shared between worker processes on the same host,
+    so entries are written to temporary file first and then atomically moved
+    in place.
+
+    When total size of cache is more than max_size least recently used
+    entries are removed. Every hit updates mtime of entry, that is used as
+    last usage time. Total size is kept in `{root}/.size` (changed under
+    flock by every put), so cache directory is walked only when entries are
+    evicted.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        self.root = root
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*parts) -> str:
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode()
+            # length prefix, so ('ab', 'c') and ('a', 'bc') differ
+            h.update(str(len(part)).encode() + b':')
+            h.update(part)
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str):
+        """
+        :return path to cached file or None if there is no such entry.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def copy(self, key: str, destination: str) -> bool:
+        """
+        Copies cached file to destination. Entries are never hardlinked to
+        sandboxes: a write through such link (e.g. via symlink planted by
+        submission) would change the entry for every later submission.
+        :return False on cache miss.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            copy_file(path, destination)
+        except FileNotFoundError:
+            # evicted by another process right now
+            return False
+        return True
+
+    def put_file(self, key: str, source: str, mode=0o755) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{secrets.token_hex(8)}.tmp'
+        shutil.copyfile(source, temp_path)
+        os.chmod(temp_path, mode)
+        self.replace(temp_path, path)
+        return path
+
+    def put_data(self, key: str, data: bytes, mode=0o755) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{secrets.token_hex(8)}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, mode)
+        self.replace(temp_path, path)
+        return path
+
+    def put_fileobj(self, key: str, fileobj, mode=0o755) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{secrets.token_hex(8)}.tmp'
+        with open(temp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        os.chmod(temp_path, mode)
+        self.replace(temp_path, path)
+        return path
+
+    def replace(self, temp_path: str, path: str):
+        """
+        Moves written temporary file to entry path, updates total size and
+        evicts entries if cache is too large.
+        """
+        size = os.path.getsize(temp_path)
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, '.size'), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            total_size = f.read().strip()
+            try:
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(temp_path, path)
+            if total_size.isdigit():
+                total_size = int(total_size) + size
+            else:
+                # not counted yet
+                total_size = self.max_size + 1
+            if total_size > self.max_size:
+                total_size = self.evict()
+            f.seek(0)
+            f.truncate()
+            f.write(str(total_size))
+
+    def evict(self) -> int:
+        """
+        Removes least recently used entries until cache takes 90% of
+        max_size, so full cache is not walked on every put.
+        :return total size of remaining entries.
+        """
+        entries = []
+        total_size = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp') or name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+        if total_size <= self.max_size:
+            return total_size
+        # least recently used first
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        return total_size
@@ -1,15 +1,83 @@
-from celery import chord
+from celery import chord, group
+from django.conf import settings
 
-from polygon.models import Submission
-from .tasks import judge_submission_task, \
-    sandbox_run_on_error
+from polygon.models import Invocation, Submission
+from .progress import publish_submission_state
+from .tasks import aggregate_test_slices_task, compile_submission_task, \
+    invocation_run_on_error, is_judged_in_slices, \
+    judge_invocation_solution_task, judge_submission_task, \
+    judge_test_slice_task, prepare_test_slices_task, sandbox_run_on_error
 
+# Origins of submissions. Judging of every origin goes to its own queue, so
+# rejudges and polygon invocations never delay contest submissions.
+CONTEST = 'contest'
+PROBLEMSET = 'problemset'
+POLYGON = 'polygon'
+REJUDGE = 'rejudge'
 
-def judge_submission(submission: Submission, commit=True):
+# Compilation queue is shared by all origins, messages are ordered by
+# priority there (0 is the highest).
+compilation_priorities = {
+    CONTEST: 0,
+    PROBLEMSET: 3,
+    POLYGON: 6,
+    REJUDGE: 9,
+}
+
+
+def judge_queue(origin):
+    return {
+        CONTEST: settings.JUDGE_CONTEST_QUEUE,
+        PROBLEMSET: settings.JUDGE_PROBLEMSET_QUEUE,
+        POLYGON: settings.JUDGE_POLYGON_QUEUE,
+        REJUDGE: settings.JUDGE_REJUDGE_QUEUE,
+    }[origin]
+
+
+def judge_submission(submission: Submission, commit=True, origin=POLYGON):
+    """
+    :param origin: where submission comes from, it selects queue and
+    priority of judging.
+    """
     submission.erase_verdict()
     submission.in_queue = True
     submission.save()
-    task = judge_submission_task.s(submission.pk).on_error(sandbox_run_on_error.s(submission.pk))
+    publish_submission_state(submission)
+    queue = judge_queue(origin)
+    problem = submission.problem
+    if is_judged_in_slices(problem):
+        # slices are judged by different workers at the same time
+        judge_task = prepare_test_slices_task.s().set(queue=queue) | chord(
+            (judge_test_slice_task.si(submission.pk, slice_index,
+                                      problem.judge_slice_count).set(
+                queue=queue)
+             for slice_index in range(problem.judge_slice_count)),
+            aggregate_test_slices_task.s(submission.pk).set(queue=queue))
+    else:
+        judge_task = judge_submission_task.s().set(queue=queue)
+    # compiled on compilation queue, so judging worker gets ready binary
+    task = (compile_submission_task.si(submission.pk).set(
+        priority=compilation_priorities[origin]) | judge_task).on_error(
+        sandbox_run_on_error.s(submission.pk))
+    if commit:
+        task.apply_async()
+    else:
+        return task
+
+
+def run_invocation(invocation: Invocation, commit=True):
+    """
+    Every solution of invocation is executed by its own task on polygon
+    queue, so solutions run on all workers at once.
+    """
+    queue = judge_queue(POLYGON)
+    task = group(
+        (compile_submission_task.si(solution.pk).set(
+            priority=compilation_priorities[POLYGON]) |
+         judge_invocation_solution_task.s(invocation.pk).set(
+             queue=queue)).on_error(
+            invocation_run_on_error.s(solution.pk, invocation.pk))
+        for solution in invocation.solutions.all())
     if commit:
         task.apply_async()
     else:
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0044_auto_20191101_1503'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='checker_epsilon',
+            field=models.FloatField(default=1e-06),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='checker_type',
+            field=models.CharField(choices=[('testlib', 'testlib checker'), ('exact', 'Exact bytes'), ('tokens', 'Tokens, whitespace insensitive'), ('float', 'Float tokens with epsilon')], default='testlib', max_length=16),
+        ),
+    ]
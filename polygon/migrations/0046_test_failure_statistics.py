@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0045_problem_checker_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='run_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0046_test_failure_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompilationArtifact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('used_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('succeeded', models.BooleanField(default=False)),
+                ('binary', models.BinaryField(blank=True, null=True)),
+                ('log', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
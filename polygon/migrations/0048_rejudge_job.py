@@ -0,0 +1,36 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contester', '0004_contestusersubmission_upsolving'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polygon', '0047_compilation_artifact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejudgeJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=16)),
+                ('verdict', models.CharField(blank=True, choices=[('OK', 'OK'), ('WA', 'Wrong answer'), ('PE', 'Presentation error'), ('EOF', 'UNEXPECTED_EOF'), ('TLE', 'Time limit exceeded'), ('MLE', 'Memory limit exceeded'), ('RE', 'Runtime error'), ('CP', 'Compilation Error'), ('TE', 'Test error'), ('WTE', 'Test error'), ('UC', 'Unknown code'), ('PTS', 'POINTS')], default='', max_length=64)),
+                ('submitted_after', models.DateTimeField(blank=True, null=True)),
+                ('submitted_before', models.DateTimeField(blank=True, null=True)),
+                ('total', models.IntegerField(default=0)),
+                ('queued_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('last_submission_id', models.IntegerField(default=0)),
+                ('contest', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contester.Contest')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('problem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='polygon.Problem')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0048_rejudge_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='judge_slice_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
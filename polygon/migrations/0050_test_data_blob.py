@@ -0,0 +1,72 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:19
+
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import get_storage_class
+from django.db import migrations, models
+
+
+# same layout as polygon.blob_store at the time of this migration, it is not
+# imported so that later changes of the module do not change the migration
+def blob_storage():
+    return get_storage_class(settings.TEST_BLOB_STORAGE)(
+        location=settings.TEST_BLOB_STORAGE_LOCATION)
+
+
+def blob_name(key):
+    return f'{key[:2]}/{key}'
+
+
+def move_test_data_to_blob_store(apps, schema_editor):
+    # generated tests keep arguments of generator in data
+    Test = apps.get_model('polygon', 'Test')
+    storage = blob_storage()
+    for test in Test.objects.filter(use_generator=False).only(
+            'pk', 'data').iterator():
+        content = test.data.encode()
+        data_hash = hashlib.sha256(content).hexdigest()
+        data_size = len(content)
+        if not storage.exists(blob_name(data_hash)):
+            storage.save(blob_name(data_hash), ContentFile(content))
+        Test.objects.filter(pk=test.pk).update(data='', data_hash=data_hash,
+                                               data_size=data_size)
+
+
+def move_test_data_from_blob_store(apps, schema_editor):
+    Test = apps.get_model('polygon', 'Test')
+    storage = blob_storage()
+    for test in Test.objects.filter(use_generator=False).exclude(
+            data_hash='').only('pk', 'data_hash').iterator():
+        with storage.open(blob_name(test.data_hash), 'rb') as f:
+            data = f.read().decode(errors='replace')
+        Test.objects.filter(pk=test.pk).update(data=data, data_hash='',
+                                               data_size=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0049_problem_judge_slice_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='data_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='data_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='test',
+            name='data',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(move_test_data_to_blob_store,
+                             move_test_data_from_blob_store),
+    ]
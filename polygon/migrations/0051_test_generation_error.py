@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0050_test_data_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='generation_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
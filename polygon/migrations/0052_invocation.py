@@ -0,0 +1,41 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polygon', '0051_test_generation_error'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polygon.Problem')),
+                ('solutions', models.ManyToManyField(to='polygon.Submission')),
+                ('tests', models.ManyToManyField(to='polygon.Test')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InvocationResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_used', models.FloatField(default=-1)),
+                ('memory_used', models.IntegerField(default=-1)),
+                ('verdict_message', models.CharField(default='', max_length=256)),
+                ('verdict', models.CharField(blank=True, choices=[('OK', 'OK'), ('WA', 'Wrong answer'), ('PE', 'Presentation error'), ('EOF', 'UNEXPECTED_EOF'), ('TLE', 'Time limit exceeded'), ('MLE', 'Memory limit exceeded'), ('RE', 'Runtime error'), ('CP', 'Compilation Error'), ('TE', 'Test error'), ('WTE', 'Test error'), ('UC', 'Unknown code'), ('PTS', 'POINTS')], default=None, max_length=64, null=True)),
+                ('invocation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polygon.Invocation')),
+                ('solution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polygon.Submission')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polygon.Test')),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def move_generated_input_metadata(apps, schema_editor):
+    # inputs of generated tests are never in blob store, data_hash of them
+    # was set by prewarm_test_inputs
+    Test = apps.get_model('polygon', 'Test')
+    Test.objects.filter(use_generator=True).update(
+        generated_hash=F('data_hash'), generated_size=F('data_size'),
+        data_hash='', data_size=0)
+
+
+def restore_generated_input_metadata(apps, schema_editor):
+    Test = apps.get_model('polygon', 'Test')
+    Test.objects.filter(use_generator=True).update(
+        data_hash=F('generated_hash'), data_size=F('generated_size'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polygon', '0052_invocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='generated_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='generated_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(move_generated_input_metadata,
+                             restore_generated_input_metadata),
+    ]
@@ -1,3 +1,6 @@
 from .problem import *
 from .test import *
 from .submission import *
+from .compilation import *
+from .rejudge import *
+from .invocation import *
@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class CompilationArtifact(models.Model):
+    """
+    Result of submission compilation, shared by all workers. Key is a hash
+    of submission type, source and compiler flags (see polygon/compilation.py),
+    so identical resubmissions and rejudges are not compiled again.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    used_at = models.DateTimeField(auto_now=True, db_index=True)
+    key = models.CharField(max_length=64, unique=True)
+    succeeded = models.BooleanField(default=False)
+    binary = models.BinaryField(blank=True, null=True)
+    log = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f'{self.key} | {self.succeeded}'
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from polygon.models import Problem, Submission, Test
+
+
+class Invocation(models.Model):
+    """
+    Solutions (submissions of problem) executed on chosen tests, all tests
+    are executed for every solution (see polygon.judge.run_invocation).
+    Results are shown as test x solution grid and are not saved to the
+    solutions themselves.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL,
+                                   null=True, blank=True)
+    solutions = models.ManyToManyField(Submission)
+    tests = models.ManyToManyField(Test)
+
+    def __str__(self):
+        return f'{self.pk} | {self.problem.name}'
+
+
+class InvocationResult(models.Model):
+    invocation = models.ForeignKey(Invocation, on_delete=models.CASCADE)
+    solution = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    test = models.ForeignKey(Test, on_delete=models.CASCADE)
+    time_used = models.FloatField(default=-1)
+    memory_used = models.IntegerField(default=-1)
+    verdict_message = models.CharField(default='', max_length=256)
+    verdict = models.CharField(choices=Submission.VERDICT_TYPES,
+                               blank=True,
+                               max_length=64,
+                               default=None,
+                               null=True)
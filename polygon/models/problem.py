@@ -9,6 +9,19 @@ from django.dispatch import receiver
 
 
 class Problem(models.Model):
+    # Checkers. Everything except testlib is built in (see polygon/checkers.py)
+    TESTLIB_CHECKER = 'testlib'
+    EXACT_CHECKER = 'exact'
+    TOKENS_CHECKER = 'tokens'
+    FLOAT_CHECKER = 'float'
+
+    CHECKER_TYPES = (
+        (TESTLIB_CHECKER, 'testlib checker'),
+        (EXACT_CHECKER, 'Exact bytes'),
+        (TOKENS_CHECKER, 'Tokens, whitespace insensitive'),
+        (FLOAT_CHECKER, 'Float tokens with epsilon'),
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     name = models.CharField(max_length=128, unique=True)
@@ -17,10 +30,17 @@ class Problem(models.Model):
     is_interactive = models.BooleanField(default=False)
     is_graded = models.BooleanField(default=False)
     is_sub_task = models.BooleanField(default=False)
+    # Tests are split into this many slices judged by different workers at
+    # the same time (see polygon/tasks.py), 1 - whole submission on one worker
+    judge_slice_count = models.PositiveIntegerField(default=1)
     solution = models.TextField(blank=True)
     solution_compiled = models.BinaryField(blank=True, null=True)
     checker = models.TextField(blank=True)
     checker_compiled = models.BinaryField(blank=True, null=True)
+    checker_type = models.CharField(choices=CHECKER_TYPES,
+                                    default=TESTLIB_CHECKER, max_length=16)
+    # absolute or relative error allowed by float checker
+    checker_epsilon = models.FloatField(default=1e-6)
     interactor = models.TextField(blank=True, default='')
     interactor_compiled = models.BinaryField(blank=True, null=True)
     is_active = models.BooleanField(default=False)
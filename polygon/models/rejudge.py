@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from polygon.models import Problem, Submission
+
+
+class RejudgeJob(models.Model):
+    """
+    Background rejudge of submissions matching filter, see
+    polygon.tasks.run_rejudge_job.
+    Submissions are processed in order of pk, last_submission_id is the
+    position of job, so job can be continued after worker restart.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    CANCELLED = 'CANCELLED'
+
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (CANCELLED, 'Cancelled'),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL,
+                                   null=True)
+    status = models.CharField(choices=STATUSES, default=PENDING,
+                              max_length=16)
+
+    # Filter
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, null=True,
+                                blank=True)
+    contest = models.ForeignKey('contester.Contest', on_delete=models.CASCADE,
+                                null=True, blank=True)
+    verdict = models.CharField(choices=Submission.VERDICT_TYPES, blank=True,
+                               default='', max_length=64)
+    submitted_after = models.DateTimeField(null=True, blank=True)
+    submitted_before = models.DateTimeField(null=True, blank=True)
+
+    # Progress
+    total = models.IntegerField(default=0)
+    queued_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    last_submission_id = models.IntegerField(default=0)
+
+    def get_submissions(self):
+        submissions = Submission.objects.all()
+        if self.problem_id is not None:
+            submissions = submissions.filter(problem_id=self.problem_id)
+        if self.contest_id is not None:
+            submissions = submissions.filter(
+                contestusersubmission__contest_id=self.contest_id)
+        if self.verdict:
+            submissions = submissions.filter(verdict=self.verdict)
+        if self.submitted_after is not None:
+            submissions = submissions.filter(
+                created_at__gte=self.submitted_after)
+        if self.submitted_before is not None:
+            submissions = submissions.filter(
+                created_at__lte=self.submitted_before)
+        return submissions
+
+    def processed_count(self):
+        return self.queued_count + self.skipped_count
+
+    def __str__(self):
+        return f'{self.pk} | {self.status} | {self.processed_count()}/' \
+               f'{self.total}'
@@ -1,5 +1,6 @@
 from django.db import models
 
+from polygon.blob_store import blob_store
 from polygon.models import Problem
 from utils import IndexedModel
 
@@ -34,7 +35,35 @@ class Test(IndexedModel):
     use_generator = models.BooleanField(default=False)
     generator = models.ForeignKey(Generator, null=True, blank=True,
                                   on_delete=models.SET_NULL)
-    data = models.TextField()
+    # Arguments of generator. Inputs of other tests are in blob store, test
+    # keeps only their key (sha256) and size.
+    data = models.TextField(blank=True)
+    data_hash = models.CharField(max_length=64, blank=True)
+    data_size = models.BigIntegerField(default=0)
+    # Inputs of generated tests are not stored, their hash and size are set
+    # when they are pre-generated on worker (see
+    # polygon.tasks.prewarm_test_inputs), or error if generator failed.
+    generated_hash = models.CharField(max_length=64, blank=True)
+    generated_size = models.BigIntegerField(default=0)
+    generation_error = models.TextField(blank=True)
+    # Judging statistics, tests that fail often are executed first
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+
+    def set_data(self, content):
+        """
+        Puts input of test to blob store.
+        :param content: bytes, str or django File (e.g. uploaded file).
+        """
+        self.data_hash, self.data_size = blob_store.put(content)
+
+    def read_data(self) -> bytes:
+        if not self.data_hash:
+            return b''
+        return blob_store.read(self.data_hash)
+
+    def failure_rate(self):
+        return self.failure_count / self.run_count if self.run_count else 0
 
     def __str__(self):
         return self.problem.name + ' | ' + str(self.index)
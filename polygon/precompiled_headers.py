@@ -0,0 +1,133 @@
+"""
+Precompiled headers for judge compilations.
+
+testlib.h (checkers, interactors, generators, judge solutions) and
+bits/stdc++.h (submissions) are precompiled once per worker host for exact
+compiler version and flags. Header is put together with its `.gch` to
+`{JUDGE_CACHE_DIR}/pch/{key}/` and that folder is passed with -I, gcc uses
+precompiled header when it finds header there. Sources must not be compiled
+in a folder with another copy of header, gcc looks there first.
+
+If header can not be precompiled compilation goes without it.
+"""
+import os
+import secrets
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from .execution import chmod_tree, make_dirs, remove_tree, run
+from .file_cache import FileCache, hash_file
+
+pch_root = os.path.join(settings.JUDGE_CACHE_DIR, 'pch')
+
+testlib_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                            'payload', 'testlib.h')
+
+# {key: folder or None if it failed}, so every process tries only once
+built_headers = {}
+
+compiler = None
+
+
+def compiler_version():
+    global compiler
+    if compiler is None:
+        try:
+            compiler = run(['g++', '--version'],
+                           capture_output=True).stdout.decode()
+        except OSError:
+            compiler = ''
+    return compiler
+
+
+def find_system_header(name, flags):
+    """
+    :return path of system header `name` (e.g. bits/stdc++.h) or None.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.cpp')
+        with open(source, 'w') as f:
+            f.write(f'#include <{name}>\n')
+        try:
+            # -H prints included headers to stderr, `. path` for first level
+            cp = run(['g++', *flags.split(), '-E', '-H', '-o', os.devnull,
+                      source], capture_output=True)
+        except OSError:
+            return None
+    for line in cp.stderr.decode().splitlines():
+        if line.startswith('. ') and line.endswith(name):
+            return line[2:]
+    return None
+
+
+def build_precompiled_header(name, source, flags):
+    """
+    Precompiles header file `source` as `name` (as it is included) with
+    flags.
+    :return folder to pass with -I or None if header can not be precompiled.
+    """
+    key = FileCache.key(name, hash_file(source), flags, compiler_version())
+    if key in built_headers:
+        return built_headers[key]
+    directory = os.path.join(pch_root, key)
+    if not os.path.isdir(directory):
+        # built in temporary folder, other processes see only complete one
+        temp_directory = f'{directory}.{secrets.token_hex(8)}.tmp'
+        header = os.path.join(temp_directory, name)
+        make_dirs(os.path.dirname(header))
+        shutil.copyfile(source, header)
+        # libraries are inputs of linker and language is set for header,
+        # otherwise g++ tries to link header
+        compile_flags = []
+        for flag in flags.split():
+            if compile_flags[-1:] == ['-x']:
+                compile_flags.pop()
+            elif not flag.startswith('-l'):
+                compile_flags.append(flag)
+        cp = run(['g++', *compile_flags, '-x', 'c++-header', '-o',
+                  f'{header}.gch', header], capture_output=True)
+        if cp.returncode != 0:
+            print(f'FAILED to precompile {name}: {cp.stderr.decode()}')
+            remove_tree(temp_directory)
+            built_headers[key] = None
+            return None
+        # submissions are compiled by dummy user
+        chmod_tree(temp_directory, 0o755)
+        try:
+            os.rename(temp_directory, directory)
+        except OSError:
+            # built by another process at the same time
+            remove_tree(temp_directory)
+        print(f'{name} precompiled')
+    built_headers[key] = directory
+    return directory
+
+
+def include_flags(name, source, flags):
+    """
+    :return g++ arguments that make header available precompiled.
+    """
+    if source is None:
+        return []
+    try:
+        directory = build_precompiled_header(name, source, flags)
+    except OSError as e:
+        print(f'FAILED to precompile {name}: {e}')
+        return []
+    return [f'-I{directory}'] if directory is not None else []
+
+
+def testlib_include_flags(flags):
+    return include_flags('testlib.h', testlib_path, flags)
+
+
+# {flags: path}, g++ is asked only once per process
+stdcpp_paths = {}
+
+
+def stdcpp_include_flags(flags):
+    if flags not in stdcpp_paths:
+        stdcpp_paths[flags] = find_system_header('bits/stdc++.h', flags)
+    return include_flags('bits/stdc++.h', stdcpp_paths[flags], flags)
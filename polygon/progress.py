@@ -0,0 +1,213 @@
+"""
+Live judging progress.
+
+Progress of running submission (current test, partial verdict, time and
+memory used so far) is written to redis (celery broker) instead of
+Submission row, so judging does not update database on every test and
+clients polling submission state do not read it.
+
+Current state of submission is kept in hash `submission-progress:{id}`
+(values are json), every update is also published as json event to pub/sub
+channel with the same name.
+
+Events of pub/sub channels are pushed to browsers as server-sent events by
+stream_events. Open streams are registered in sorted set `event-streams`
+(stream id: start time), so there are at most
+settings.EVENT_STREAM_MAX_CONNECTIONS of them.
+"""
+import json
+import time
+import uuid
+
+import redis
+from django.conf import settings
+from django.db import connection
+
+from arrow.celery import broker
+from polygon.models import Submission
+
+# progress of abandoned submissions (e.g. killed worker) is dropped by redis
+progress_ttl = 60 * 60
+
+# Event stream is closed after this many seconds and browser reconnects, so
+# it does not hold server worker and redis connection forever.
+event_stream_lifetime = 5 * 60
+# Comment is sent if there are no events, so proxies keep connection
+event_stream_keepalive = 15
+
+event_streams_key = 'event-streams'
+
+redis_connection = None
+
+
+def get_redis():
+    global redis_connection
+    if redis_connection is None:
+        redis_connection = redis.Redis.from_url(broker)
+    return redis_connection
+
+
+def progress_key(submission_id):
+    return f'submission-progress:{submission_id}'
+
+
+def publish_progress(submission_id, **state):
+    """
+    Updates fields of submission progress. Failures are only logged,
+    progress is not worth failing judging.
+    """
+    key = progress_key(submission_id)
+    try:
+        pipeline = get_redis().pipeline()
+        pipeline.hmset(key, {name: json.dumps(value)
+                             for name, value in state.items()})
+        pipeline.expire(key, progress_ttl)
+        pipeline.publish(key, json.dumps({'submission': submission_id,
+                                          **state}))
+        pipeline.execute()
+    except redis.RedisError as e:
+        print(f'FAILED to publish progress of submission {submission_id}: {e}')
+
+
+def publish_submission_state(submission):
+    """
+    Replaces progress with state of submission (e.g. when it is queued,
+    judging is started or done).
+    """
+    clear_progress(submission.pk)
+    publish_progress(submission.pk,
+                     in_queue=submission.in_queue,
+                     testing=submission.testing,
+                     tested=submission.tested,
+                     verdict=submission.verdict,
+                     verdict_message=submission.verdict_message,
+                     testing_message=submission.testing_message,
+                     max_time_used=submission.max_time_used,
+                     max_memory_used=submission.max_memory_used,
+                     points=submission.points)
+
+
+def get_progress(submission_id):
+    """
+    :return dict with progress of submission or None if there is no progress
+    (judging not started for a long time, or redis is not available).
+    """
+    try:
+        raw_state = get_redis().hgetall(progress_key(submission_id))
+    except redis.RedisError as e:
+        print(f'FAILED to get progress of submission {submission_id}: {e}')
+        return None
+    if not raw_state:
+        return None
+    return {name.decode(): json.loads(value)
+            for name, value in raw_state.items()}
+
+
+def get_submission_state(submission_id):
+    """
+    :return progress of submission, database is read only if there is no
+    progress in redis. Message is the same as Submission.get_verdict.
+    """
+    state = get_progress(submission_id)
+    if state is None:
+        state = Submission.objects.filter(pk=submission_id).values(
+            'in_queue', 'testing', 'tested', 'verdict', 'verdict_message',
+            'testing_message', 'max_time_used', 'max_memory_used',
+            'points').first()
+        if state is None:
+            return None
+    state['submission'] = submission_id
+    state['message'] = Submission(**{
+        name: state[name] for name in ('in_queue', 'testing', 'tested',
+                                       'verdict_message', 'testing_message')
+        if name in state}).get_verdict()
+    return state
+
+
+def clear_progress(submission_id):
+    try:
+        get_redis().delete(progress_key(submission_id))
+    except redis.RedisError as e:
+        print(f'FAILED to clear progress of submission {submission_id}: {e}')
+
+
+def format_event(event):
+    return f'data: {json.dumps(event)}\n\n'
+
+
+def open_event_stream():
+    """
+    Registers new event stream if there are less than
+    settings.EVENT_STREAM_MAX_CONNECTIONS open streams.
+    :return id of registered stream or None if there are too many streams.
+    """
+    stream_id = uuid.uuid4().hex
+    now = time.time()
+    try:
+        pipeline = get_redis().pipeline(transaction=True)
+        # streams of killed web servers are forgotten after their lifetime
+        pipeline.zremrangebyscore(
+            event_streams_key, '-inf',
+            now - event_stream_lifetime - 2 * event_stream_keepalive)
+        pipeline.zadd(event_streams_key, {stream_id: now})
+        pipeline.zcard(event_streams_key)
+        stream_count = pipeline.execute()[-1]
+    except redis.RedisError as e:
+        print(f'FAILED to open event stream: {e}')
+        return None
+    if stream_count > settings.EVENT_STREAM_MAX_CONNECTIONS:
+        close_event_stream(stream_id)
+        return None
+    return stream_id
+
+
+def close_event_stream(stream_id):
+    try:
+        get_redis().zrem(event_streams_key, stream_id)
+    except redis.RedisError as e:
+        print(f'FAILED to close event stream {stream_id}: {e}')
+
+
+def registered_events(events, stream_id):
+    """
+    Yields events, stream is unregistered when they end or client leaves.
+    """
+    try:
+        yield from events
+    finally:
+        close_event_stream(stream_id)
+
+
+def stream_events(channels, initial_events=(), is_finished=None):
+    """
+    Yields server-sent events: initial_events and then events published to
+    redis pub/sub channels. Stream ends with {"end": true} event when
+    is_finished(event) is true for received event.
+    """
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    try:
+        # subscribed before initial events, so nothing is missed between
+        pubsub.subscribe(*channels)
+        yield 'retry: 2000\n\n'
+        for event in initial_events:
+            yield format_event(event)
+            if is_finished is not None and is_finished(event):
+                yield format_event({'end': True})
+                return
+        # database is not used while waiting, stream must not hold connection
+        connection.close()
+        deadline = time.monotonic() + event_stream_lifetime
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=event_stream_keepalive)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            event = json.loads(message['data'])
+            yield format_event(event)
+            if is_finished is not None and is_finished(event):
+                yield format_event({'end': True})
+                return
+    except redis.RedisError as e:
+        print(f'FAILED to stream events of {channels}: {e}')
+    finally:
+        pubsub.close()
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import SubmissionTestResult
+
+
+class TestResultBuffer:
+    """
+    Collects finished SubmissionTestResult objects in memory and writes them
+    with one bulk_create at the end of judging or every
+    JUDGE_RESULT_FLUSH_INTERVAL seconds (0 means only at the end), instead
+    of several UPDATEs per test.
+
+    Results must be added only when they are final, they are never saved
+    again. If test_group_results ({test group id: SubmissionTestGroupResult})
+    is given, results are linked to result of their test group.
+    """
+
+    def __init__(self, test_group_results=None):
+        self.test_group_results = test_group_results or {}
+        self.pending = []
+        self.lock = threading.Lock()
+        self.last_flush_time = time.monotonic()
+
+    def add(self, test_result):
+        test_group_result = self.test_group_results.get(
+            test_result.test.group_id)
+        if test_group_result is not None:
+            test_result.test_group_result = test_group_result
+        with self.lock:
+            self.pending.append(test_result)
+        interval = settings.JUDGE_RESULT_FLUSH_INTERVAL
+        if interval and time.monotonic() - self.last_flush_time >= interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.last_flush_time = time.monotonic()
+        if pending:
+            SubmissionTestResult.objects.bulk_create(pending)
@@ -2,6 +2,8 @@ import os
 import secrets
 import subprocess
 
+from .execution import chmod_tree, copy_tree, remove_tree, run
+
 
 class DefaultSandbox:
     """
@@ -88,7 +90,7 @@ class DefaultSandbox:
     def run(self) -> dict:
         res = self.prepare()
         # rm folder to be sure.
-        subprocess.run(f'rm -rf {self.app_path}{self.folder}', shell=True)
+        remove_tree(f'{self.app_path}{self.folder}')
         return res
 
     def create_and_write_to_file(self, path, data):
@@ -109,10 +111,11 @@ class DefaultSandbox:
         """
 
         # Copy payload folder at /app/payload
-        cp = subprocess.run(
-            f'mkdir {self.app_path}{self.folder} && cp -rp {self.app_path}payload/* {self.app_path}{self.folder}',
-            shell=True)
-        if cp.returncode != 0:
+        try:
+            os.makedirs(f'{self.app_path}{self.folder}')
+            copy_tree(f'{self.app_path}payload',
+                      f'{self.app_path}{self.folder}')
+        except OSError:
             print(
                 f'COMMAND FAILED:Copy payload failed ')
             return self.internal_error('Copy payload failed')
@@ -122,17 +125,14 @@ class DefaultSandbox:
             self.create_and_write_to_file(
                 f'{self.app_path}{self.folder}/{path}', data)
 
-        cp = subprocess.run(f'chmod -R 777 {self.app_path}{self.folder}',
-                            shell=True)
-        cp = subprocess.run(
-            f'chmod -R 666 {self.app_path}{self.folder}/usercode', shell=True)
-        cp = subprocess.run(
-            f'chmod 667 {self.app_path}{self.folder}/usercode', shell=True)
+        chmod_tree(f'{self.app_path}{self.folder}', 0o777)
+        chmod_tree(f'{self.app_path}{self.folder}/usercode', 0o666)
+        os.chmod(f'{self.app_path}{self.folder}/usercode', 0o667)
         print('Files copied')
         return self.execute()
 
     def internal_error(self, message):
-        subprocess.run(f'rm -r {self.app_path}{self.folder}', shell=True)
+        remove_tree(f'{self.app_path}{self.folder}')
         return {
             'IE': True,
             'errors': message,
@@ -157,20 +157,21 @@ class DefaultSandbox:
                 }
         """
 
-        run_command = f'defaultSandboxRunScript.sh {self.app_path}{self.folder} {str(self.memory_limit)} {str(self.time_limit)} {self.wall_time_limit} {self.run_command.format(self.app_path + self.folder + "/usercode")} '
+        run_argv = [f'{self.app_path}{self.folder}/defaultSandboxRunScript.sh',
+                    f'{self.app_path}{self.folder}', str(self.memory_limit),
+                    str(self.time_limit), str(self.wall_time_limit),
+                    *self.run_command.format(
+                        self.app_path + self.folder + "/usercode").split()]
         try:
-            subprocess.run(f'{self.app_path}{self.folder}/{run_command}',
-                           timeout=self.container_wall_time_limit,
-                           stderr=subprocess.PIPE,
-                           shell=True,
-                           stdout=subprocess.PIPE)
+            run(run_argv,
+                timeout=self.container_wall_time_limit,
+                capture_output=True)
         except subprocess.TimeoutExpired:
             return self.internal_error(
                 'Wall time exceeded\nInternal error, see logs')
         except subprocess.CalledProcessError:
             pass
         except:
-            subprocess.run(f'rm -r {self.app_path}{self.folder}', shell=True)
             return self.internal_error('Internal error, see logs')
         meta = str()
         try:
@@ -235,5 +236,5 @@ class DefaultSandbox:
                     continue
         except IOError:
             print('failed to open file /response_file')
-        subprocess.run(f'rm -rf {self.app_path}{self.folder}', shell=True)
+        remove_tree(f'{self.app_path}{self.folder}')
         return data
@@ -0,0 +1,76 @@
+"""
+Working directories of judge sandboxes.
+
+Sandboxes are created under JUDGE_SANDBOX_ROOT, that is meant to be a size
+capped tmpfs (e.g. `--tmpfs /sandbox:size=4g` for worker container), so
+tests input, output, answers and meta files never touch disk. Submissions
+whose tests do not fit to free space there use JUDGE_SANDBOX_DISK_ROOT.
+
+Folders of crashed tasks are never removed by them, so folders that were
+not modified for JUDGE_SANDBOX_MAX_AGE seconds are garbage collected.
+Running judge modifies its folder on every test.
+"""
+import os
+import secrets
+import shutil
+import time
+
+from django.conf import settings
+
+from .execution import make_dirs, remove_tree
+
+last_collection_time = 0
+
+
+def sandbox_roots():
+    roots = [settings.JUDGE_SANDBOX_ROOT]
+    if settings.JUDGE_SANDBOX_DISK_ROOT != settings.JUDGE_SANDBOX_ROOT:
+        roots.append(settings.JUDGE_SANDBOX_DISK_ROOT)
+    return roots
+
+
+def collect_orphaned_sandbox_folders():
+    global last_collection_time
+    last_collection_time = time.time()
+    for root in sandbox_roots():
+        try:
+            names = os.listdir(root)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                age = time.time() - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age > settings.JUDGE_SANDBOX_MAX_AGE:
+                print(f'Removing orphaned sandbox folder {path}')
+                remove_tree(path)
+
+
+def choose_sandbox_root(required_size):
+    """
+    :return JUDGE_SANDBOX_ROOT if it has required_size bytes free, otherwise
+    (or if required_size is None) JUDGE_SANDBOX_DISK_ROOT.
+    """
+    root = settings.JUDGE_SANDBOX_ROOT
+    make_dirs(root)
+    if root != settings.JUDGE_SANDBOX_DISK_ROOT and (
+            required_size is None or
+            shutil.disk_usage(root).free < required_size):
+        print(f'Sandbox size {required_size} does not fit, using disk')
+        root = settings.JUDGE_SANDBOX_DISK_ROOT
+        make_dirs(root)
+    return root
+
+
+def prepare_sandbox_folder(required_size=0):
+    """
+    :return (sandbox_root, folder), sandbox is `{sandbox_root}{folder}`.
+    Folder itself is not created.
+    """
+    if time.time() - last_collection_time > settings.JUDGE_SANDBOX_GC_INTERVAL:
+        collect_orphaned_sandbox_folders()
+    sandbox_root = os.path.join(choose_sandbox_root(required_size), '')
+    folder = secrets.token_hex(16)
+    return sandbox_root, folder
@@ -1,9 +1,35 @@
 import os
-import secrets
+import queue
+import shlex
+import stat
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from celery.signals import worker_ready
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
 
 from arrow.celery import app
-from .models import Submission, SubmissionTestResult, SubmissionTestGroupResult
+from .blob_store import blob_store
+from .box_pool import box_pool
+from .checkers import run_builtin_checker
+from .compilation import needs_compilation, get_or_compile_artifact, \
+    put_submission_binary
+from .execution import chmod_tree, copy_file, copy_tree, make_dirs, \
+    make_executable, open_new_file, remove_tree, run, run_interactive
+from .file_cache import FileCache, hash_file, remove_file
+from .models import CompilationArtifact, InvocationResult, Problem, \
+    RejudgeJob, Submission, SubmissionTestResult, SubmissionTestGroupResult, \
+    Test
+from .precompiled_headers import testlib_include_flags
+from .progress import publish_progress, publish_submission_state
+from .result_buffer import TestResultBuffer
+from .sandbox_folders import collect_orphaned_sandbox_folders, \
+    prepare_sandbox_folder
 
 
 def create_and_write_to_file_binary(path, data):
@@ -26,36 +52,23 @@ def create_and_write_to_file(path, data):
         return Exception(f'FAILED TO WRITE/OPEN FILE: {path}')
 
 
-def cpp17_submission_compilation(app_path, folder, submission):
-    create_and_write_to_file(f'{app_path}{folder}/submission.cpp',
-                             submission.data)
-    try:
-        cp = subprocess.run(
-            f'/bin/su -c "g++ -std=c++17 -static -lm -s -x c++ -W -O2 -std=c++17 -o usercode/submission submission.cpp" dummy',
-            shell=True, capture_output=True, cwd=f'{app_path}{folder}',
-            timeout=10)  # if too long then its bad
-    except subprocess.TimeoutExpired:
+def cpp17_submission_compilation(sandbox_root, folder, submission):
+    # Usually compiled already by compile_submission_task
+    artifact = put_submission_binary(submission, f'{sandbox_root}{folder}')
+    if artifact is not None:
         submission.testing = False
         submission.tested = True
         submission.verdict = Submission.CP
         submission.verdict_message = 'Compilation Error'
-        submission.verdict_description = 'Compilation took too long'
-        submission.save()
-        return Submission.CP
-
-    if cp.returncode != 0:
-        submission.testing = False
-        submission.tested = True
-        submission.verdict = Submission.CP
-        submission.verdict_message = 'Compilation Error'
-        submission.verdict_description = cp.stdout.decode() + '\n' + cp.stderr.decode()
+        submission.verdict_description = artifact.log
         submission.save()
         return Submission.CP
 
 
-def python3_submission_compilation(app_path, folder, submission):
-    create_and_write_to_file(f'{app_path}{folder}/usercode/submission.py',
-                             submission.data)
+def python3_submission_compilation(sandbox_root, folder, submission):
+    make_dirs(f'{sandbox_root}{folder}/usercode')
+    with open_new_file(f'{sandbox_root}{folder}/usercode/submission.py') as f:
+        f.write(submission.data.encode())
 
 
 compilation_dict = {
@@ -63,6 +76,15 @@ compilation_dict = {
     Submission.PYTHON3: python3_submission_compilation
 }
 
+# Copied to every sandbox
+payload_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                            'payload')
+
+# Files in sandbox usercode folder that survive box reset between tests.
+# Input and output files are always removed, so nothing submission leaves
+# there (e.g. symlink to answer_file) is used by the next test.
+usercode_files = ('submission', 'submission.py')
+
 run_command_dict = {
     Submission.CPP17: './submission',
     Submission.PYTHON3: '/usr/bin/python3.7 submission.py'
@@ -86,168 +108,229 @@ def set_test_error(submission, test_result=None, message='Test Error',
         test_result.verdict_debug_description = debug_description
 
 
-def copy_payload_and_compile_all(submission, tests, app_path, folder):
+# Flags used to compile solution, checker, interactor and generators.
+# They are part of artifact cache key.
+problem_compilation_flags = '-std=c++17 -static'
+
+artifact_cache = FileCache(
+    os.path.join(settings.JUDGE_CACHE_DIR, 'artifacts'),
+    settings.JUDGE_ARTIFACT_CACHE_SIZE)
+
+# Inputs of generated tests, key is made of generator source and arguments.
+input_cache = FileCache(
+    os.path.join(settings.JUDGE_CACHE_DIR, 'inputs'),
+    settings.JUDGE_INPUT_CACHE_SIZE)
+
+# Inputs of uploaded tests, key is Test.data_hash.
+test_data_cache = FileCache(
+    os.path.join(settings.JUDGE_CACHE_DIR, 'tests'),
+    settings.JUDGE_TEST_DATA_CACHE_SIZE)
+
+# Answers of judge solution. Key is made of solution source and test input
+# hash, so changes of solution, generators or tests invalidate it.
+answer_cache = FileCache(
+    os.path.join(settings.JUDGE_CACHE_DIR, 'answers'),
+    settings.JUDGE_ANSWER_CACHE_SIZE)
+
+
+def copy_or_compile_artifact(submission, name, source, get_compiled,
+                             save_compiled, sandbox_root, folder):
+    """
+    Puts compiled `source` to `{sandbox_root}{folder}/{name}`.
+    Binary is copied from artifact cache if it is there. On cache miss
+    compiled binary is taken from database (get_compiled) or, if there is
+    none, source is compiled and binary is saved with save_compiled.
+    Both ways binary ends up in cache.
+    submission may be None when nothing is judged (e.g. inputs prewarm).
+    """
+    path = f'{sandbox_root}{folder}/{name}'
+    key = FileCache.key(source, problem_compilation_flags)
+    if artifact_cache.copy(key, path):
+        print(f'{name} taken from artifact cache.')
+        return
+
+    compiled = get_compiled()
+    if compiled is not None:
+        print(f'{name} does not need compilation.')
+        create_and_write_to_file_binary(path, compiled)
+        make_executable(path)
+    else:
+        # not next to testlib.h of sandbox, so precompiled one is found
+        source_path = f'{sandbox_root}{folder}/sources/{name}.cpp'
+        create_and_write_to_file(source_path, source)
+        cp = run(['g++', *problem_compilation_flags.split(),
+                  *testlib_include_flags(problem_compilation_flags),
+                  f'-I{sandbox_root}{folder}', '-o', path, source_path],
+                 capture_output=True)
+        if cp.returncode != 0:
+            if submission is not None:
+                set_test_error(submission,
+                               debug_message=f'{name} compilation error',
+                               debug_description=cp.stdout.decode() + '\n' + cp.stderr.decode())
+                submission.save()
+            raise Exception(f'{name} compilation error')
+        try:
+            fs = open(path, 'rb')
+            save_compiled(fs.read())
+            fs.close()
+        except IOError:
+            print(f'FAILED TO READ FILE: compiled {name}')
+    artifact_cache.put_file(key, path)
+    print(f'{name} compiled')
+
+
+def copy_or_compile_generators(submission, problem, sandbox_root, folder):
+    for generator in problem.generator_set.defer('generator_compiled'):
+        def save_generator_compiled(compiled, generator=generator):
+            generator.generator_compiled = compiled
+            generator.save(update_fields=['generator_compiled'])
+
+        copy_or_compile_artifact(submission, generator.name,
+                                 generator.generator,
+                                 lambda: generator.generator_compiled,
+                                 save_generator_compiled,
+                                 sandbox_root, folder)
+
+
+def copy_payload(sandbox_root, folder):
+    """
+    Copies payload folder (polygon/payload) to sandbox.
+    :return False on failure.
+    """
+    try:
+        os.makedirs(f'{sandbox_root}{folder}')
+        copy_tree(payload_path, f'{sandbox_root}{folder}')
+    except OSError:
+        return False
+    return True
+
+
+def copy_payload_and_compile_all(submission, tests, sandbox_root, folder):
     # --------------------------------------------------------------------------
     # Copy payload folder at /app/polygon/payload
-    cp = subprocess.run(
-        f'mkdir {app_path}{folder} && cp -rp {app_path}payload/* {app_path}{folder}',
-        shell=True)
-    if cp.returncode != 0:
+    if not copy_payload(sandbox_root, folder):
         set_test_error(submission, debug_message='Copy payload failed')
         raise Exception('Copy payload failed')
 
     # Copy user code and compile it
-    if compilation_dict[submission.submission_type](app_path, folder,
+    if compilation_dict[submission.submission_type](sandbox_root, folder,
                                                     submission) == Submission.CP:
         return Submission.CP
     print('User code compiled')
     # ==========================================================================
 
+    copy_or_compile_problem(submission, submission.problem, sandbox_root,
+                            folder)
+
+
+def copy_or_compile_problem(submission, problem, sandbox_root, folder):
+    """
+    Puts solution, checker, interactor and generators of problem to sandbox.
+    submission may be None when nothing is judged, errors are not saved
+    then.
+    """
+    # Compiled binaries are deferred (see judge_submission_task), so database
+    # is queried for them only on artifact cache miss.
+    def save_problem_compiled(field):
+        def save(compiled):
+            setattr(problem, field, compiled)
+            problem.save(update_fields=[field])
+
+        return save
+
     # --------------------------------------------------------------------------
     # Copy solution checker and compile if needed
-    if submission.problem.solution_compiled is not None:
-        print('Solution does not need compilation.')
-        create_and_write_to_file_binary(f'{app_path}{folder}/solution',
-                                        submission.problem.solution_compiled)
-        subprocess.run(f'chmod +x {app_path}{folder}/solution', shell=True)
-    else:
-        create_and_write_to_file(f'{app_path}{folder}/solution.cpp',
-                                 submission.problem.solution)
-        cp = subprocess.run(
-            f'g++ -std=c++17 -static -o {app_path}{folder}/solution {app_path}{folder}/solution.cpp',
-            shell=True, capture_output=True)
-        if cp.returncode != 0:
-            set_test_error(submission,
-                           debug_message='Solution compilation error',
-                           debug_description=cp.stdout.decode() + '\n' + cp.stderr.decode())
-            submission.save()
-            raise Exception('Solution compilation error')
-        try:
-            fs = open(f'{app_path}{folder}/solution', 'rb')
-            problem = submission.problem
-            problem.solution_compiled = fs.read()
-            problem.save()
-            fs.close()
-        except IOError:
-            print('FAILED TO READ FILE: compiled solution')
-    print('solution compiled')
-
-    if submission.problem.checker_compiled is not None:
-        print('Checker does not need compilation.')
-        create_and_write_to_file_binary(f'{app_path}{folder}/checker',
-                                        submission.problem.checker_compiled)
-        subprocess.run(f'chmod +x {app_path}{folder}/checker', shell=True)
-    else:
-        create_and_write_to_file(f'{app_path}{folder}/checker.cpp',
-                                 submission.problem.checker)
-        cp = subprocess.run(
-            f'g++ -std=c++17 -static -o {app_path}{folder}/checker {app_path}{folder}/checker.cpp',
-            shell=True, capture_output=True)
-        if cp.returncode != 0:
-            set_test_error(submission,
-                           debug_message='Checker compilation error',
-                           debug_description=cp.stdout.decode() + '\n' + cp.stderr.decode())
-            submission.save()
-            raise Exception('Checker compilation error')
-        try:
-            fs = open(f'{app_path}{folder}/checker', 'rb')
-            problem = submission.problem
-            problem.checker_compiled = fs.read()
-            problem.save()
-            fs.close()
-        except IOError:
-            print('FAILED TO READ FILE: compiled checker')
-    print('checker compiled')
+    copy_or_compile_artifact(submission, 'solution', problem.solution,
+                             lambda: problem.solution_compiled,
+                             save_problem_compiled('solution_compiled'),
+                             sandbox_root, folder)
+    if problem.checker_type == Problem.TESTLIB_CHECKER:
+        copy_or_compile_artifact(submission, 'checker', problem.checker,
+                                 lambda: problem.checker_compiled,
+                                 save_problem_compiled('checker_compiled'),
+                                 sandbox_root, folder)
     # ==========================================================================
 
     # --------------------------------------------------------------------------
     # if problem is interactive then compile interactor.
-    if submission.problem.is_interactive:
-        if submission.problem.interactor_compiled is not None:
-            print('Interactor does not need compilation.')
-            create_and_write_to_file_binary(f'{app_path}{folder}/interactor',
-                                            submission.problem.interactor_compiled)
-            subprocess.run(f'chmod +x {app_path}{folder}/interactor',
-                           shell=True)
-        else:
-            create_and_write_to_file(f'{app_path}{folder}/interactor.cpp',
-                                     submission.problem.interactor)
-            cp = subprocess.run(
-                f'g++ -std=c++17 -static -o {app_path}{folder}/interactor {app_path}{folder}/interactor.cpp',
-                shell=True, capture_output=True)
-            if cp.returncode != 0:
-                set_test_error(submission,
-                               debug_message='Interactor compilation error',
-                               debug_description=cp.stdout.decode() + '\n' + cp.stderr.decode())
-                submission.save()
-                raise Exception('interactor compilation error')
-            try:
-                fs = open(f'{app_path}{folder}/interactor', 'rb')
-                problem = submission.problem
-                problem.interactor_compiled = fs.read()
-                problem.save()
-                fs.close()
-            except IOError:
-                print('FAILED TO READ FILE: compiled interactor')
-        print('interactor compiled')
+    if problem.is_interactive:
+        copy_or_compile_artifact(submission, 'interactor', problem.interactor,
+                                 lambda: problem.interactor_compiled,
+                                 save_problem_compiled('interactor_compiled'),
+                                 sandbox_root, folder)
     # ==========================================================================
 
     # --------------------------------------------------------------------------
     # Copy and compile generators
-    for generator in submission.problem.generator_set.all():
-        if generator.generator_compiled is not None:
-            print(f'Generator {generator.name} does not need compilation.')
-            create_and_write_to_file_binary(
-                f'{app_path}{folder}/{generator.name}',
-                generator.generator_compiled)
-            subprocess.run(f'chmod +x {app_path}{folder}/{generator.name}',
-                           shell=True)
-        else:
-            create_and_write_to_file(f'{app_path}{folder}/{generator.name}.cpp',
-                                     generator.generator)
-            cp = subprocess.run(
-                f'g++ -std=c++17 -static -o {app_path}{folder}/{generator.name} {app_path}{folder}/{generator.name}.cpp',
-                shell=True, capture_output=True)
-            if cp.returncode != 0:
-                set_test_error(submission,
-                               debug_message='Generator compilation error',
-                               debug_description=cp.stdout.decode() + '\n' + cp.stderr.decode())
-                submission.save()
-                raise Exception(f'Generator: {generator} compilation error')
-            try:
-                fs = open(f'{app_path}{folder}/{generator.name}', 'rb')
-                generator.generator_compiled = fs.read()
-                generator.save()
-                fs.close()
-            except IOError:
-                print(
-                    f'FAILED TO READ FILE: compiled generator {generator.name}')
-        print(f'Generator: {generator.name} compiled')
+    copy_or_compile_generators(submission, problem, sandbox_root, folder)
     # ==========================================================================
 
 
-def generate_test(submission, test, test_result, app_path, folder):
+def generated_input_key(generator, args):
+    return FileCache.key(
+        FileCache.key(generator.generator, problem_compilation_flags), args)
+
+
+def run_generator(test, sandbox_root, folder, input_folder=None):
+    """
+    Writes input of generated test to `{sandbox_root}{input_folder}/input_file`
+    (input_folder is folder by default), generators are in folder.
+    Input is copied from input cache if it was generated before,
+    otherwise generator is executed and its output is cached.
+    :return None on success, completed process of failed generator otherwise.
+    """
+    input_path = f'{sandbox_root}{input_folder or folder}/input_file'
+    key = generated_input_key(test.generator, test.data)
+    if input_cache.copy(key, input_path):
+        print(f'Test #{test.index} taken from input cache')
+        return None
+    # input of previous test is removed, output is never written through
+    # existing file
+    remove_file(input_path)
+    cp = run([f'{sandbox_root}{folder}/{test.generator.name}',
+              *shlex.split(test.data)],
+             stdout=input_path, capture_output=True)
+    if cp.returncode != 0:
+        return cp
+    input_cache.put_file(key, input_path, mode=0o644)
+    return None
+
+
+def fetch_test_input(test, sandbox_root, folder):
+    """
+    Copies input of uploaded test to `{sandbox_root}{folder}/input_file`.
+    Input is downloaded from blob store to test data cache once per host.
+    """
+    input_path = f'{sandbox_root}{folder}/input_file'
+    if not test.data_hash:
+        remove_file(input_path)
+        create_and_write_to_file_binary(input_path, b'')
+        return
+    if test_data_cache.copy(test.data_hash, input_path):
+        return
+    with blob_store.open(test.data_hash) as f:
+        test_data_cache.put_fileobj(test.data_hash, f, mode=0o644)
+    if not test_data_cache.copy(test.data_hash, input_path):
+        raise Exception(f'Test #{test.index} data evicted from cache')
+
+
+def generate_test(submission, test, test_result, sandbox_root, folder):
     if test.use_generator:
         # Run generator
-        cp = subprocess.run(
-            f'{app_path}{folder}/{test.generator.name} {test.data} | tee {app_path}{folder}/input_file' +
-            (
-                f' {app_path}{folder}/usercode/input_file' if not submission.problem.is_interactive else ''),
-            shell=True, capture_output=True)
-        if cp.returncode != 0:
+        cp = run_generator(test, sandbox_root, folder)
+        if cp is not None:
             test_result.verdict = SubmissionTestResult.TE
             test_result.verdict_debug_message = f'Generator exit code {cp.returncode}'
-            test_result.save()
             raise Exception(
                 f'Generator: {test.generator} runtime error\n Generator output: \n{cp.stdout.decode()}\n{cp.stderr.decode()}')
     else:
         # Copy test
-        create_and_write_to_file(f'{app_path}{folder}/input_file',
-                                 test.data)
-        if not submission.problem.is_interactive:
-            create_and_write_to_file(
-                f'{app_path}{folder}/usercode/input_file',
-                test.data)
+        fetch_test_input(test, sandbox_root, folder)
+    if not submission.problem.is_interactive:
+        # usercode is writable from sandbox, so whatever submission left at
+        # input_file (e.g. symlink to answer_file) is replaced, not followed
+        copy_file(f'{sandbox_root}{folder}/input_file',
+                  f'{sandbox_root}{folder}/usercode/input_file')
     print(f'Test #{test.index} writen')
 
 
@@ -276,58 +359,69 @@ container_wall_time_limit = 300  # 300 seconds for whole task
 wall_time_limit = 10  # 10 seconds
 
 
-def execute_submission(submission, test_result, app_path, folder):
-    memory_limit = submission.problem.memory_limit
-    time_limit = submission.problem.time_limit
-    run_command = f'{app_path}{folder}/run_isolate.sh {app_path}{folder} {str(memory_limit)} {str(time_limit)} {wall_time_limit} {run_command_dict[submission.submission_type]}'
+def isolate_run_argv(submission, sandbox_root, folder, box_id,
+                     redirect_io=True):
+    """
+    argv of isolate run of user code in already initialized box.
+    Without redirect_io stdin and stdout are inherited (interactive problems).
+    """
+    path = f'{sandbox_root}{folder}'
+    argv = ['isolate', f'--box-id={box_id}', '-s', '--env=HOME=/root',
+            f'--time={submission.problem.time_limit}',
+            f'--wall-time={wall_time_limit}',
+            f'--dir={path}/usercode:rw']
+    if redirect_io:
+        argv += [f'--stdin={path}/usercode/input_file',
+                 f'--stdout={path}/usercode/output_file',
+                 f'--stderr={path}/usercode/error_file']
+    argv += [f'--mem={submission.problem.memory_limit}', '--cg',
+             f'--meta={path}/meta', f'--chdir={path}/usercode', '--run', '--',
+             *run_command_dict[submission.submission_type].split()]
+    return argv
+
+
+def execute_submission(submission, test_result, sandbox_root, folder, box_id):
     try:
-        cp = subprocess.run(f'sh {run_command}',
-                            timeout=container_wall_time_limit,
-                            capture_output=True,
-                            cwd=f'{app_path}{folder}',
-                            shell=True)
+        cp = run(isolate_run_argv(submission, sandbox_root, folder, box_id),
+                 timeout=container_wall_time_limit,
+                 capture_output=True,
+                 cwd=f'{sandbox_root}{folder}')
         test_result.verdict_debug_message += '\n' + cp.stdout.decode() + '\n\n' + cp.stderr.decode()
-        test_result.save()
     except subprocess.TimeoutExpired:
         test_result.verdict = SubmissionTestResult.WTL
-        test_result.save()
         return False
     return True
 
 
-def execute_submission_interactive(submission, test_result, app_path, folder):
-    memory_limit = submission.problem.memory_limit
-    time_limit = submission.problem.time_limit
-    run_command = f'{app_path}{folder}/run_isolate_interactive.sh {app_path}{folder} {str(memory_limit)} {str(time_limit)} {wall_time_limit} {run_command_dict[submission.submission_type]}'
-    interactor_command = f'{app_path}{folder}/interactor {app_path}{folder}/input_file {app_path}{folder}/output_file'
+def execute_submission_interactive(submission, test_result, sandbox_root, folder,
+                                   box_id):
+    """
+    :return completed interactor process or None if wall time exceeded.
+    """
+    interactor_argv = [f'{sandbox_root}{folder}/interactor',
+                       f'{sandbox_root}{folder}/input_file',
+                       f'{sandbox_root}{folder}/output_file']
     try:
-        # We executing solo with out sh script. It is easier that way.
-        subprocess.run(f'mkfifo {app_path}{folder}/fifo',
-                       cwd=f'{app_path}{folder}', shell=True)
-        subprocess.run(f'isolate --cg --init',
-                       cwd=f'{app_path}{folder}', shell=True)
-        cp = subprocess.run(
-            f'{interactor_command} < {app_path}{folder}/fifo | sh {run_command} > {app_path}{folder}/fifo ' + '; exit "${PIPESTATUS[0]}"',
-            executable='/bin/bash',
-            timeout=container_wall_time_limit,
-            capture_output=True,
-            cwd=f'{app_path}{folder}',
-            shell=True)
+        interactor, _ = run_interactive(
+            interactor_argv,
+            isolate_run_argv(submission, sandbox_root, folder, box_id,
+                             redirect_io=False),
+            cwd=f'{sandbox_root}{folder}',
+            timeout=container_wall_time_limit)
     except subprocess.TimeoutExpired:
         test_result.verdict = Submission.WTL
         test_result.verdict_message = 'Wall time limit exceeded'
-        test_result.save()
-        return False
-    return True
+        return None
+    return interactor
 
 
-def check_isolate_failed(submission, test_result, meta):
+def check_isolate_failed(submission, test_result, meta, save=True):
     if 'status' in meta and meta['status'] == 'XX':
-        set_test_error(submission,
-                       test_result,
-                       debug_message='Meta status is XX')
-        test_result.save()
-        submission.save()
+        if save:
+            set_test_error(submission,
+                           test_result,
+                           debug_message='Meta status is XX')
+            submission.save()
         raise Exception('Meta status is XX retrying...')
 
 
@@ -352,39 +446,42 @@ def apply_meta_related_verdicts(meta, test, test_result):
             test_result.verdict = meta_status[meta['status']]
             test_result.verdict_message = \
                 f'{meta_status_verbose[meta["status"]]} on test #{test.index}'
-            test_result.save()
             return False
     return True
 
 
-def execute_judge_solution(submission, test_result, app_path, folder):
+def execute_judge_solution(submission, test_result, sandbox_root, folder):
     if not submission.problem.is_interactive:
-        cp = subprocess.run(
-            f'{app_path}{folder}/solution < {app_path}{folder}/input_file > {app_path}{folder}/answer_file',
-            shell=True)
+        # Answer depends only on solution and input, so it is computed once
+        answer_key = FileCache.key(
+            FileCache.key(submission.problem.solution,
+                          problem_compilation_flags),
+            hash_file(f'{sandbox_root}{folder}/input_file'))
+        if answer_cache.copy(answer_key, f'{sandbox_root}{folder}/answer_file'):
+            print('Answer taken from answer cache')
+            return True
+        # answer of previous test is removed, output is never written through
+        # existing file
+        remove_file(f'{sandbox_root}{folder}/answer_file')
+        cp = run([f'{sandbox_root}{folder}/solution'],
+                 stdin=f'{sandbox_root}{folder}/input_file',
+                 stdout=f'{sandbox_root}{folder}/answer_file')
         if cp.returncode != 0:
             test_result.verdict = SubmissionTestResult.TF
             test_result.verdict_debug_message = f'Judge Solution exit code {cp.returncode}'
-            test_result.save()
             return False
+        answer_cache.put_file(answer_key, f'{sandbox_root}{folder}/answer_file',
+                              mode=0o644)
     else:
-        # make pipe for interactor
-        subprocess.run(f'mkfifo {app_path}{folder}/fifo',
-                       cwd=f'{app_path}{folder}', shell=True)
-        interactor_command = f'{app_path}{folder}/interactor {app_path}{folder}/input_file {app_path}{folder}/answer_file'
-        cp = subprocess.run(
-            f'{interactor_command} < {app_path}{folder}/fifo | {app_path}{folder}/solution > {app_path}{folder}/fifo ' + '; exit "${PIPESTATUS[0]}"',
-            # f'{app_path}{folder}/solution < {app_path}{folder}/input_file > {app_path}{folder}/answer_file',
-            executable='/bin/bash',
-            cwd=f'{app_path}{folder}',
-            shell=True)
-        # rm pipe
-        cp = subprocess.run(f'rm {app_path}{folder}/fifo',
-                            cwd=f'{app_path}{folder}', shell=True)
+        interactor_argv = [f'{sandbox_root}{folder}/interactor',
+                           f'{sandbox_root}{folder}/input_file',
+                           f'{sandbox_root}{folder}/answer_file']
+        cp, _ = run_interactive(interactor_argv,
+                                [f'{sandbox_root}{folder}/solution'],
+                                cwd=f'{sandbox_root}{folder}')
         if cp.returncode != 0:
             test_result.verdict = SubmissionTestResult.TF
             test_result.verdict_debug_message = f'Judge Solution exit code {cp.returncode}'
-            test_result.save()
             return False
     return True
 
@@ -412,36 +509,51 @@ def apply_checker_verdict(submission, test, test_result, checker_returncode):
                 test_result.verdict_message += '\nTest Failed'
                 test_result.verdict_debug_message = 'Checker error'
                 test_result.verdict_debug_description = 'Checker is a grader but problem is not graded or you mixed is_graded and is_sub_task!'
-                test_result.save()
                 return False
         if checker_returncode in checker_verdict_dict:
             test_result.verdict = checker_verdict_dict[checker_returncode]
             test_result.verdict_message += f'\n{checker_verdict_dict_verbose[checker_returncode]} on test #{test.index}'
-            test_result.save()
             return False
         else:
             test_result.verdict = Submission.UNKNOWN_CODE
             test_result.verdict_message = f'{checker_verdict_dict_verbose[checker_returncode]} on test #{test.index}'
-            test_result.save()
             return False
     test_result.verdict = SubmissionTestResult.OK
     test_result.verdict_message = 'Accepted'
-    test_result.save()
     return True
 
 
-def execute_checker(submission, test_result, app_path, folder):
-    run_command = f'{app_path}{folder}/checker {app_path}{folder}/input_file {app_path}{folder}/usercode/output_file {app_path}{folder}/answer_file {app_path}{folder}/checker_result'
+def is_regular_file(path):
+    try:
+        return stat.S_ISREG(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def execute_checker(submission, test_result, sandbox_root, folder):
+    output_file = f'{sandbox_root}{folder}/usercode/output_file'
     if submission.problem.is_interactive:
-        run_command = f'{app_path}{folder}/checker {app_path}{folder}/input_file {app_path}{folder}/output_file {app_path}{folder}/answer_file {app_path}{folder}/checker_result'
-    cp = subprocess.run(run_command, shell=True, capture_output=True,
-                        cwd=f'{app_path}{folder}', )
+        output_file = f'{sandbox_root}{folder}/output_file'
+    elif not is_regular_file(output_file):
+        # e.g. symlink to answer_file made by submission
+        return 1, 'Output file is missing or not a regular file'
+    if submission.problem.checker_type != Problem.TESTLIB_CHECKER:
+        # Built-in checker, no process is started
+        checker_returncode, checker_output = run_builtin_checker(
+            submission.problem, output_file,
+            f'{sandbox_root}{folder}/answer_file')
+        test_result.verdict_debug_description += '\n' + checker_output
+        print(checker_output)
+        return checker_returncode, checker_output
+    cp = run([f'{sandbox_root}{folder}/checker', f'{sandbox_root}{folder}/input_file',
+              output_file, f'{sandbox_root}{folder}/answer_file',
+              f'{sandbox_root}{folder}/checker_result'],
+             capture_output=True, cwd=f'{sandbox_root}{folder}')
     checker_returncode = cp.returncode
     checker_output = cp.stdout.decode() + '\n' + cp.stderr.decode()
     try:
-        fs = open(f'{app_path}{folder}/checker_result')
+        fs = open(f'{sandbox_root}{folder}/checker_result')
         test_result.verdict_debug_description += '\n' + fs.read(2024)
-        test_result.save()
     except IOError:
         print(f'FAILED to read checker_result, Please check checker')
         # test_result.verdict = SubmissionTestResult.TF
@@ -450,189 +562,384 @@ def execute_checker(submission, test_result, app_path, folder):
     return checker_returncode, checker_output
 
 
-def run_judge_sandbox(submission, tests, app_path, folder):
-    # --------------------------------------------------------------------------
-    # Delete previous records
-    submission.submissiontestresult_set.all().delete()
+def judge_test(submission, test, sandbox_root, folder, box_id,
+               report_progress=True):
+    """
+    Runs submission on a single test inside isolate box `box_id`, using
+    `{sandbox_root}{folder}` as working directory.
+    Returns (test_result, passed). If passed is False then test_result
+    holds the verdict of the failure. test_result is not saved.
+    :param report_progress: publish progress and save isolate failures to
+    submission, False when submission is only run (see invocations).
+    """
+    test_result = SubmissionTestResult(
+        submission=submission,
+        test=test,
+    )
+    # Notify user about test, result itself is saved by TestResultBuffer
+    if report_progress:
+        publish_progress(submission.pk,
+                         testing_message=f'Testing on test #{test.index}')
+
+    # Box is already initialized, only remove what previous test left
+    # TODO replace isolate with proper sandboxing solution
+    box_pool.reset(box_id, f'{sandbox_root}{folder}/usercode',
+                   keep=usercode_files)
     # ==========================================================================
 
-    if copy_payload_and_compile_all(submission, tests, app_path,
-                                    folder) == Submission.CP:
-        return Submission.CP
+    # Prepare test input
+    try:
+        generate_test(submission, test, test_result, sandbox_root, folder)
+    except Exception as e:
+        print(e)
+        return test_result, False
+    # ==========================================================================
 
-    # --------------------------------------------------------------------------
-    # ensure dir permission is ok
-    subprocess.run(f'chmod -R 777 {app_path}{folder}', shell=True)
-    subprocess.run(f'chmod -R 677 {app_path}{folder}/usercode', shell=True)
-    subprocess.run(f'chmod 677 {app_path}{folder}/usercode', shell=True)
-    print('Files copied and compiled')
+    # Run user code
+    if not submission.problem.is_interactive:
+        if not execute_submission(submission,
+                                  test_result,
+                                  sandbox_root,
+                                  folder,
+                                  box_id):
+            return test_result, False
+    else:
+        cp = execute_submission_interactive(submission,
+                                            test_result,
+                                            sandbox_root,
+                                            folder,
+                                            box_id)
+        if cp is None:
+            return test_result, False
+        meta = parse_isolate_meta_file(f'{sandbox_root}{folder}/meta')
+        # If isolate fails => retry
+        check_isolate_failed(submission, test_result, meta, report_progress)
+
+        test_result.verdict_debug_message += '\ninteractor\n'
+        # pipes live only as long as processes, so user can not leave
+        # unread input for the next test.
+        return_code = cp.returncode
+        if return_code != 0:
+            if cp.returncode == 3:
+                test_result.verdict = Submission.TF
+                test_result.verdict_message = 'Test Failed'
+                test_result.verdict_debug_message = 'Interactor error'
+                return test_result, False
+            checker_verdict_dict = {
+                1: SubmissionTestResult.WA,
+                2: SubmissionTestResult.PE,
+                3: SubmissionTestResult.TF,
+            }
+            checker_verdict_dict_verbose = {
+                1: 'Wrong answer',
+                2: 'Presentation error',
+                3: 'Test Fail',
+            }
+            print(
+                f'Interactor on test #{test.index} return code: {return_code}. stdout: \n{cp.stdout.decode()}\n stderr:\n{cp.stderr.decode()}')
+            if return_code in checker_verdict_dict:
+                test_result.verdict = checker_verdict_dict[return_code]
+                test_result.verdict_message = f'{checker_verdict_dict_verbose[return_code]} on test #{test.index}'
+                return test_result, False
+            else:
+                test_result.verdict = Submission.UNKNOWN_CODE
+                test_result.verdict_debug_message = f'Interactor exited with {return_code} on test #{test.index}'
+                return test_result, False
+    print(f'Successful execution')
     # ==========================================================================
 
-    # --------------------------------------------------------------------------
-    # Ok, all sources compiled. Now we should test submission
-    # We will create and write each submission verdict to model.
-    # Currently we don't save user output.
-    max_time_used = -1
-    max_memory_used = -1
-    test_results = []
-    for test in tests:
-        test_result = SubmissionTestResult(
-            submission=submission,
-            test=test,
-        )
-        test_result.save()
-        test_results.append(test_result)
-        # Notify user about test
-        submission.testing_message = f'Testing on test #{test.index}'
-        submission.save()
+    # Parse meta file
+    meta = parse_isolate_meta_file(f'{sandbox_root}{folder}/meta')
+    # ==========================================================================
 
-        # Prepare test input
-        try:
-            generate_test(submission, test, test_result, app_path, folder)
-        except Exception as e:
-            print(e)
-            break
-        # ==========================================================================
-
-        # clean up an isolate
-        # TODO replace isolate with proper sandboxing solution
-        subprocess.run(f'isolate --cleanup --cg', shell=True)
-        # ==========================================================================
-
-        # Run user code
-        if not submission.problem.is_interactive:
-            if not execute_submission(submission,
-                                      test_result,
-                                      app_path,
-                                      folder):
-                break
-        else:
-            if not execute_submission_interactive(submission,
-                                                  test_result,
-                                                  app_path,
-                                                  folder):
+    # If isolate fails => retry
+    check_isolate_failed(submission, test_result, meta, report_progress)
+    # ==========================================================================
+
+    # Lets tell user how bad he is.
+    if 'time' in meta:
+        test_result.time_used = float(meta['time'])
+    if 'max-rss' in meta:
+        test_result.memory_used = int(meta['max-rss'])
+    # ==========================================================================
+
+    # Check non checker related verdicts
+    if not apply_meta_related_verdicts(meta, test, test_result):
+        return test_result, False
+    # ==========================================================================
+
+    # OK now lets check result
+    # First run solution
+    if not execute_judge_solution(submission, test_result, sandbox_root,
+                                  folder):
+        return test_result, False
+    print('Solution executed')
+    # ==========================================================================
+
+    # Now lets run checker
+    # ./checker usercode/input_file usercode/output_file answer_file
+    # Checker should write result to fourth argument (checker_result)
+    checker_returncode, checker_output = execute_checker(submission,
+                                                         test_result,
+                                                         sandbox_root,
+                                                         folder)
+    # for debug
+    if checker_returncode == 3:
+        test_result.verdict = Submission.TF
+        test_result.verdict_message += '\nTest Failed'
+        test_result.verdict_debug_message = 'Checker error'
+        test_result.verdict_debug_description = checker_output
+        return test_result, False
+    print(f'Checker executed')
+    # ==========================================================================
+
+    # Get checker verdict
+    print(f'Checker result: {checker_returncode}')
+    return test_result, apply_checker_verdict(submission, test, test_result,
+                                              checker_returncode)
+
+
+def publish_tests_progress(submission, test_results):
+    """
+    Publishes verdict of last finished test and resources used so far.
+    """
+    test_result = test_results[-1]
+    publish_progress(
+        submission.pk,
+        test_index=test_result.test.index,
+        test_verdict=test_result.verdict,
+        tests_done=len(test_results),
+        max_time_used=max(tr.time_used for tr in test_results),
+        max_memory_used=max(tr.memory_used for tr in test_results))
+
+
+def run_tests_sequentially(submission, tests, sandbox_root, folder,
+                           stop_on_failure, result_buffer,
+                           report_progress=True):
+    test_results = []
+    box_ids = box_pool.acquire()
+    try:
+        for test in tests:
+            test_result, passed = judge_test(submission, test, sandbox_root,
+                                             folder, box_ids[0],
+                                             report_progress)
+            test_results.append(test_result)
+            if result_buffer is not None:
+                result_buffer.add(test_result)
+            if report_progress:
+                publish_tests_progress(submission, test_results)
+            if not passed and stop_on_failure:
                 break
-            meta = parse_isolate_meta_file(f'{app_path}{folder}/meta')
-            # If isolate fails => retry
-            check_isolate_failed(submission, test_result, meta)
-
-            test_result.verdict_debug_message += '\ninteractor\n'
-            # rm pipe due to user ability to skip some inputs and
-            # they will occur in next test, we do not want that.
-            cp = subprocess.run(f'rm {app_path}{folder}/fifo',
-                                cwd=f'{app_path}{folder}', shell=True)
-            return_code = cp.returncode
-            if return_code != 0:
-                if cp.returncode == 3:
-                    test_result.verdict = Submission.TF
-                    test_result.verdict_message = 'Test Failed'
-                    test_result.verdict_debug_message = 'Interactor error'
-                    test_result.save()
-                    break
-                checker_verdict_dict = {
-                    1: SubmissionTestResult.WA,
-                    2: SubmissionTestResult.PE,
-                    3: SubmissionTestResult.TF,
-                }
-                checker_verdict_dict_verbose = {
-                    1: 'Wrong answer',
-                    2: 'Presentation error',
-                    3: 'Test Fail',
-                }
-                print(
-                    f'Interactor on test #{test.index} return code: {return_code}. stdout: \n{cp.stdout.decode()}\n stderr:\n{cp.stderr.decode()}')
-                if return_code in checker_verdict_dict:
-                    test_result.verdict = checker_verdict_dict[return_code]
-                    test_result.verdict_message = f'{checker_verdict_dict_verbose[return_code]} on test #{test.index}'
-                    test_result.save()
-                    break
-                else:
-                    test_result.verdict = Submission.UNKNOWN_CODE
-                    test_result.verdict_debug_message = f'Interactor exited with {return_code} on test #{test.index}'
-                    test_result.save()
-                    break
-        print(f'Successful execution')
-        # ==========================================================================
-
-        # Parse meta file
-        meta = parse_isolate_meta_file(f'{app_path}{folder}/meta')
-        # ==========================================================================
+    finally:
+        box_pool.release(box_ids)
+    return test_results
+
+
+def run_tests_in_parallel(submission, tests, sandbox_root, folder,
+                          stop_on_failure, result_buffer,
+                          report_progress=True):
+    """
+    Fans tests out across JUDGE_BOX_COUNT isolate boxes. Every box gets its
+    own copy of the compiled sandbox folder, so tests do not share input,
+    output, meta or fifo files.
+
+    With stop_on_failure the result is the same as sequential run:
+    all tests before the first failed one (in given order) and the failed
+    test itself. Tests after already found failure are not started and
+    results of ones that finished anyway are dropped (never saved).
+    """
+    box_ids = queue.Queue()
+    box_folders = {}
+    acquired_box_ids = box_pool.acquire(len(tests))
+    for box_id in acquired_box_ids:
+        box_folder = f'{folder}-box{box_id}'
+        box_folders[box_id] = box_folder
+        box_ids.put(box_id)
+        try:
+            copy_tree(f'{sandbox_root}{folder}', f'{sandbox_root}{box_folder}')
+        except OSError:
+            box_pool.release(acquired_box_ids)
+            for box_folder in box_folders.values():
+                remove_tree(f'{sandbox_root}{box_folder}')
+            raise Exception(f'Copy sandbox for box {box_id} failed')
+
+    lock = threading.Lock()
+    first_failed_position = [len(tests)]
+    # set when a test raised (e.g. isolate failure), task is retried anyway
+    aborted = threading.Event()
+
+    def run_test(position, test):
+        with lock:
+            if aborted.is_set() or position > first_failed_position[0]:
+                return None
+        box_id = box_ids.get()
+        try:
+            test_result, passed = judge_test(submission, test, sandbox_root,
+                                             box_folders[box_id], box_id,
+                                             report_progress)
+        except BaseException:
+            aborted.set()
+            raise
+        finally:
+            box_ids.put(box_id)
+            # Django opens connection per thread, do not leak them.
+            connection.close()
+        if not passed and stop_on_failure:
+            with lock:
+                first_failed_position[0] = min(first_failed_position[0],
+                                               position)
+        return test_result
 
-        # If isolate fails => retry
-        check_isolate_failed(submission, test_result, meta)
-        # ==========================================================================
-
-        # Lets tell user how bad he is.
-        if 'time' in meta:
-            test_result.time_used = float(meta['time'])
-            max_time_used = max(max_time_used, float(meta['time']))
-            submission.max_time_used = max_time_used
-        if 'max-rss' in meta:
-            test_result.memory_used = int(meta['max-rss'])
-            max_memory_used = max(max_memory_used, int(meta['max-rss']))
-            submission.max_memory_used = max_memory_used
-        # ==========================================================================
-
-        # Check non checker related verdicts
-        if not apply_meta_related_verdicts(meta, test, test_result):
-            break
-        # ==========================================================================
-
-        # OK now lets check result
-        # First run solution
-        if not execute_judge_solution(submission, test_result, app_path,
-                                      folder):
-            break
-        print('Solution executed')
-        # ==========================================================================
-
-        # Now lets run checker
-        # ./checker usercode/input_file usercode/output_file answer_file
-        # Checker should write result to fourth argument (checker_result)
-        checker_returncode, checker_output = execute_checker(submission,
-                                                             test_result,
-                                                             app_path,
-                                                             folder)
-        # for debug
-        if checker_returncode == 3:
-            test_result.verdict = Submission.TF
-            test_result.verdict_message += '\nTest Failed'
-            test_result.verdict_debug_message = 'Checker error'
-            test_result.verdict_debug_description = checker_output
-            test_result.save()
-            break
-        print(f'Checker executed')
-        # ==========================================================================
-
-        # Get checker verdict
-        print(f'Checker result: {checker_returncode}')
-        if not apply_checker_verdict(submission, test, test_result, checker_returncode):
-            break
-    submission.verdict = test_results[-1].verdict
-    submission.verdict_message = test_results[-1].verdict_message
-    submission.testing = False
-    submission.tested = True
-    submission.save()
-    subprocess.run(f'rm -rf {app_path}{folder}', shell=True)
-    return Submission.OK
+    test_results = []
+    try:
+        with ThreadPoolExecutor(max_workers=len(box_folders)) as executor:
+            futures = [executor.submit(run_test, position, test)
+                       for position, test in enumerate(tests)]
+            # Results are taken in tests order, so when result is taken all
+            # tests before it are finished and it is known if it is needed.
+            for position, future in enumerate(futures):
+                # result() re-raises exceptions, e.g. isolate failures => retry
+                try:
+                    test_result = future.result()
+                except BaseException:
+                    # leaving executor waits for all submitted tests
+                    aborted.set()
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                if position > first_failed_position[0]:
+                    continue
+                test_results.append(test_result)
+                if result_buffer is not None:
+                    result_buffer.add(test_result)
+                if report_progress:
+                    publish_tests_progress(submission, test_results)
+    finally:
+        box_pool.release(acquired_box_ids)
+        for box_folder in box_folders.values():
+            remove_tree(f'{sandbox_root}{box_folder}')
+    return test_results
+
+
+def run_tests(submission, tests, sandbox_root, folder, stop_on_failure,
+              result_buffer, report_progress=True):
+    """
+    :return results of executed tests, they are saved through result_buffer
+    (flushed here) if it is given.
+    :param report_progress: publish progress of submission after every
+    test, False when submission is only run (see judge_test).
+    """
+    tests = list(tests)
+    try:
+        if settings.JUDGE_BOX_COUNT > 1 and len(tests) > 1:
+            return run_tests_in_parallel(submission, tests, sandbox_root,
+                                         folder, stop_on_failure,
+                                         result_buffer, report_progress)
+        return run_tests_sequentially(submission, tests, sandbox_root, folder,
+                                      stop_on_failure, result_buffer,
+                                      report_progress)
+    finally:
+        if result_buffer is not None:
+            result_buffer.flush()
+
+
+def is_test_failure(test_result):
+    # test and judge errors say nothing about test
+    return test_result.verdict not in (SubmissionTestResult.OK,
+                                       SubmissionTestResult.TE,
+                                       SubmissionTestResult.TF)
+
+
+def run_tests_failing_first(submission, tests, sandbox_root, folder,
+                            result_buffer):
+    """
+    Same as run_tests with stop_on_failure, but JUDGE_PRIORITY_TEST_COUNT
+    tests that fail most often are executed first, so wrong submissions
+    usually fail on first few tests.
+
+    If one of them fails, not executed tests before it (in given order) are
+    executed to find the first failed test in given order. Returned results
+    are the same as of run_tests: tests before the first failed one and the
+    failed one. Results of other executed priority tests are dropped.
+    Statistics of tests are updated.
+    """
+    tests = list(tests)
+    priority_tests = sorted(
+        (test for test in tests if test.failure_count > 0),
+        key=lambda test: test.failure_rate(),
+        reverse=True)[:settings.JUDGE_PRIORITY_TEST_COUNT]
+    if not priority_tests:
+        test_results = run_tests(submission, tests, sandbox_root, folder,
+                                 stop_on_failure=True,
+                                 result_buffer=result_buffer)
+        update_test_statistics(test_results)
+        return test_results
+
+    # position of test in given order
+    positions = {test.pk: position for position, test in enumerate(tests)}
+    # not saved until it is known which of them are needed
+    priority_results = run_tests(submission, priority_tests, sandbox_root,
+                                 folder, stop_on_failure=True,
+                                 result_buffer=None)
+    failed_position = len(tests)
+    if priority_results[-1].verdict != SubmissionTestResult.OK:
+        failed_position = positions[priority_results[-1].test.pk]
+    executed = {test_result.test.pk for test_result in priority_results}
+    rest_results = run_tests(
+        submission,
+        [test for test in tests[:failed_position] if test.pk not in executed],
+        sandbox_root, folder, stop_on_failure=True,
+        result_buffer=result_buffer)
+    if rest_results and rest_results[-1].verdict != SubmissionTestResult.OK:
+        failed_position = positions[rest_results[-1].test.pk]
+    update_test_statistics(priority_results + rest_results)
+
+    priority_results = [test_result for test_result in priority_results
+                        if positions[test_result.test.pk] <= failed_position]
+    for test_result in priority_results:
+        result_buffer.add(test_result)
+    result_buffer.flush()
+    return sorted(rest_results + priority_results,
+                  key=lambda test_result: positions[test_result.test.pk])
+
+
+def update_test_statistics(test_results):
+    """
+    Counts runs and failures of executed tests.
+    """
+    Test.objects.filter(
+        pk__in=[test_result.test.pk for test_result in test_results]).update(
+        run_count=F('run_count') + 1)
+    Test.objects.filter(
+        pk__in=[test_result.test.pk for test_result in test_results
+                if is_test_failure(test_result)]).update(
+        failure_count=F('failure_count') + 1)
+
+
+def apply_resources_usage(submission, test_results):
+    for test_result in test_results:
+        if test_result.time_used != -1:
+            submission.max_time_used = max(submission.max_time_used,
+                                           test_result.time_used)
+        if test_result.memory_used != -1:
+            submission.max_memory_used = max(submission.max_memory_used,
+                                             test_result.memory_used)
 
 
-def run_judge_sandbox_sub_task_problem(submission, tests, app_path, folder):
+def run_judge_sandbox(submission, tests, sandbox_root, folder):
     # --------------------------------------------------------------------------
     # Delete previous records
     submission.submissiontestresult_set.all().delete()
-    submission.submissiontestgroupresult_set.all().delete()
     # ==========================================================================
 
-    if copy_payload_and_compile_all(submission, tests, app_path,
+    if copy_payload_and_compile_all(submission, tests, sandbox_root,
                                     folder) == Submission.CP:
         return Submission.CP
 
     # --------------------------------------------------------------------------
     # ensure dir permission is ok
-    subprocess.run(f'chmod -R 777 {app_path}{folder}', shell=True)
-    subprocess.run(f'chmod -R 677 {app_path}{folder}/usercode', shell=True)
-    subprocess.run(f'chmod 677 {app_path}{folder}/usercode', shell=True)
+    chmod_tree(f'{sandbox_root}{folder}', 0o777)
+    chmod_tree(f'{sandbox_root}{folder}/usercode', 0o677)
     print('Files copied and compiled')
     # ==========================================================================
 
@@ -640,143 +947,42 @@ def run_judge_sandbox_sub_task_problem(submission, tests, app_path, folder):
     # Ok, all sources compiled. Now we should test submission
     # We will create and write each submission verdict to model.
     # Currently we don't save user output.
-    max_time_used = -1
-    max_memory_used = -1
-    test_results = []
-    for test in tests:
-        test_result = SubmissionTestResult(
-            submission=submission,
-            test=test,
-        )
-        test_result.save()
-        test_results.append(test_result)
-        # Notify user about test
-        submission.testing_message = f'Testing on test #{test.index}'
-        submission.save()
-
-        # Prepare test input
-        try:
-            generate_test(submission, test, test_result, app_path, folder)
-        except Exception as e:
-            print(e)
-            continue
-        # ==========================================================================
-
-        # clean up an isolate
-        # TODO replace isolate with proper sandboxing solution
-        subprocess.run(f'isolate --cleanup --cg', shell=True)
-        # ==========================================================================
-
-        # Run user code
-        if not submission.problem.is_interactive:
-            if not execute_submission(submission,
-                                      test_result,
-                                      app_path,
-                                      folder):
-                continue
-        else:
-            if not execute_submission_interactive(submission,
-                                                  test_result,
-                                                  app_path,
-                                                  folder):
-                continue
-            meta = parse_isolate_meta_file(f'{app_path}{folder}/meta')
-            # If isolate fails => retry
-            check_isolate_failed(submission, test_result, meta)
-
-            test_result.verdict_debug_message += '\ninteractor\n'
-            # rm pipe due to user ability to skip some inputs and
-            # they will occur in next test, we do not want that.
-            cp = subprocess.run(f'rm {app_path}{folder}/fifo',
-                                cwd=f'{app_path}{folder}', shell=True)
-            return_code = cp.returncode
-            if return_code != 0:
-                if cp.returncode == 3:
-                    test_result.verdict = Submission.TF
-                    test_result.verdict_message = 'Test Failed'
-                    test_result.verdict_debug_message = 'Interactor error'
-                    test_result.save()
-                    continue
-                checker_verdict_dict = {
-                    1: SubmissionTestResult.WA,
-                    2: SubmissionTestResult.PE,
-                    3: SubmissionTestResult.TF,
-                }
-                checker_verdict_dict_verbose = {
-                    1: 'Wrong answer',
-                    2: 'Presentation error',
-                    3: 'Test Fail',
-                }
-                print(
-                    f'Interactor on test #{test.index} return code: {return_code}. stdout: \n{cp.stdout.decode()}\n stderr:\n{cp.stderr.decode()}')
-                if return_code in checker_verdict_dict:
-                    test_result.verdict = checker_verdict_dict[return_code]
-                    test_result.verdict_message = f'{checker_verdict_dict_verbose[return_code]} on test #{test.index}'
-                    test_result.save()
-                    continue
-                else:
-                    test_result.verdict = Submission.UNKNOWN_CODE
-                    test_result.verdict_debug_message = f'Interactor exited with {return_code} on test #{test.index}'
-                    test_result.save()
-                    continue
-        print(f'Successful execution')
-        # ==========================================================================
-
-        # Parse meta file
-        meta = parse_isolate_meta_file(f'{app_path}{folder}/meta')
-        # ==========================================================================
+    # Testing stops on first failed test.
+    test_results = run_tests_failing_first(submission, tests, sandbox_root,
+                                           folder, TestResultBuffer())
+    apply_resources_usage(submission, test_results)
+    submission.verdict = test_results[-1].verdict
+    submission.verdict_message = test_results[-1].verdict_message
+    submission.testing = False
+    submission.tested = True
+    submission.save()
+    publish_submission_state(submission)
+    remove_tree(f'{sandbox_root}{folder}')
+    return Submission.OK
 
-        # If isolate fails => retry
-        check_isolate_failed(submission, test_result, meta)
-        # ==========================================================================
-
-        # Lets tell user how bad he is.
-        if 'time' in meta:
-            test_result.time_used = float(meta['time'])
-            max_time_used = max(max_time_used, float(meta['time']))
-            submission.max_time_used = max_time_used
-        if 'max-rss' in meta:
-            test_result.memory_used = int(meta['max-rss'])
-            max_memory_used = max(max_memory_used, int(meta['max-rss']))
-            submission.max_memory_used = max_memory_used
-        # ==========================================================================
-
-        # Check non checker related verdicts
-        if not apply_meta_related_verdicts(meta, test, test_result):
-            continue
-        # ==========================================================================
 
-        # OK now lets check result
-        # First run solution
-        if not execute_judge_solution(submission, test_result, app_path,
-                                      folder):
-            continue
-        print('Solution executed')
-        # ==========================================================================
-
-        # Now lets run checker
-        # ./checker usercode/input_file usercode/output_file answer_file
-        # Checker should write result to fourth argument (checker_result)
-        checker_returncode, checker_output = execute_checker(submission,
-                                                             test_result,
-                                                             app_path,
-                                                             folder)
-        # for debug
-        if checker_returncode == 3:
-            test_result.verdict = Submission.TF
-            test_result.verdict_message += '\nTest Failed'
-            test_result.verdict_debug_message = 'Checker error'
-            test_result.verdict_debug_description = checker_output
-            test_result.save()
-            continue
-        print(f'Checker executed')
-        # ==========================================================================
+def create_test_group_results(submission):
+    """
+    Creates results of all test groups of sub-task submission, so test
+    results are saved already linked to them.
+    :return {test group id: SubmissionTestGroupResult}
+    """
+    test_group_results = dict()
+    for test_group in submission.problem.testgroup_set.all():
+        test_group_result = SubmissionTestGroupResult(submission=submission,
+                                                      problem=submission.problem,
+                                                      test_group=test_group
+                                                      )
+        test_group_result.save()
+        test_group_results[test_group.pk] = test_group_result
+    return test_group_results
 
-        # Get checker verdict
-        apply_checker_verdict(submission, test, test_result, checker_returncode)
-        print(f'Checker result: {checker_returncode}')
 
-    # Now lets count points
+def apply_sub_task_points(submission, test_group_results, test_results):
+    """
+    Gives points of test groups with all tests passed and sets verdict of
+    sub-task submission. Submission is not saved.
+    """
     net_points = 0
     # Not necessary for sub task problem
     # for test_result in test_results:
@@ -788,97 +994,506 @@ def run_judge_sandbox_sub_task_problem(submission, tests, app_path, folder):
                    test_results)
             )
     )
-    test_group_results = dict()
-    for test_group in submission.problem.testgroup_set.all():
-        test_group_result = SubmissionTestGroupResult(submission=submission,
-                                                      problem=submission.problem,
-                                                      test_group=test_group
-                                                      )
+    for test_group_result in test_group_results.values():
+        test_group = test_group_result.test_group
         required_tests = set(test_group.test_set.values_list('pk', flat=True))
         if required_tests.issubset(ok_tests):
             test_group_result.points = test_group.points
             net_points += test_group.points
-        test_group_results[test_group.name] = test_group_result
-        test_group_result.save()
-    for test_result in test_results:
-        try:
-            if test_result.test.group:
-                test_result.test_group_result = test_group_results[
-                    test_result.test.group.name]
-                test_result.save()
-        except Exception as e:
-            print(e)
+    SubmissionTestGroupResult.objects.bulk_update(
+        test_group_results.values(), ['points'])
 
     submission.verdict = Submission.OK
     submission.verdict_message = f'OK. Points: {net_points}'
+    submission.points = net_points
+
+
+def run_judge_sandbox_sub_task_problem(submission, tests, sandbox_root, folder):
+    # --------------------------------------------------------------------------
+    # Delete previous records
+    submission.submissiontestresult_set.all().delete()
+    submission.submissiontestgroupresult_set.all().delete()
+    # ==========================================================================
+
+    if copy_payload_and_compile_all(submission, tests, sandbox_root,
+                                    folder) == Submission.CP:
+        return Submission.CP
+
+    # --------------------------------------------------------------------------
+    # ensure dir permission is ok
+    chmod_tree(f'{sandbox_root}{folder}', 0o777)
+    chmod_tree(f'{sandbox_root}{folder}/usercode', 0o677)
+    print('Files copied and compiled')
+    # ==========================================================================
+
+    # --------------------------------------------------------------------------
+    # Ok, all sources compiled. Now we should test submission
+    # We will create and write each submission verdict to model.
+    # Currently we don't save user output.
+    # All tests are executed to count points.
+    test_group_results = create_test_group_results(submission)
+    test_results = run_tests(submission, tests, sandbox_root, folder,
+                             stop_on_failure=False,
+                             result_buffer=TestResultBuffer(
+                                 test_group_results))
+    update_test_statistics(test_results)
+    apply_resources_usage(submission, test_results)
+
+    # Now lets count points
+    apply_sub_task_points(submission, test_group_results, test_results)
     submission.testing = False
     submission.tested = True
-    submission.points = net_points
     submission.save()
+    publish_submission_state(submission)
 
-    subprocess.run(f'rm -rf {app_path}{folder}', shell=True)
+    remove_tree(f'{sandbox_root}{folder}')
     return Submission.OK
 
 
-def prepare_sandbox_folder():
-    app_path = os.path.dirname(os.path.realpath(__file__)) + '/'
-    folder = 'temp/' + secrets.token_hex(16)
-
-    return app_path, folder
+def estimate_sandbox_size(tests):
+    """
+    :return approximate size of sandbox in bytes or None if it is unknown.
+    Largest test is there at most four times at once (input in sandbox and
+    usercode, output, answer) in every box.
+    """
+    max_input_size = 0
+    for test in tests:
+        size = test.data_size
+        if test.use_generator and test.generator is not None:
+            path = input_cache.get(generated_input_key(test.generator,
+                                                       test.data))
+            if path is None:
+                # not generated yet, size is unknown
+                return None
+            size = os.path.getsize(path)
+        max_input_size = max(max_input_size, size)
+    return (4 * max_input_size + settings.JUDGE_SANDBOX_BASE_SIZE) * \
+        settings.JUDGE_BOX_COUNT
 
 
 @app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
           default_retry_delay=10)
-def judge_submission_task(submission_id):
+def compile_submission_task(submission_id):
+    """
+    Compiles submission if there is no CompilationArtifact for it yet.
+    :return submission_id, so judge_submission_task can be chained.
+    """
+    submission = Submission.objects.get(pk=submission_id)
+    if not needs_compilation(submission):
+        return submission_id
+    sandbox_root, folder = prepare_sandbox_folder()
+    try:
+        make_dirs(f'{sandbox_root}{folder}')
+        chmod_tree(f'{sandbox_root}{folder}', 0o777)
+        get_or_compile_artifact(submission, f'{sandbox_root}{folder}')
+    finally:
+        remove_tree(f'{sandbox_root}{folder}')
+    return submission_id
+
+
+@app.task
+def delete_unused_compilation_artifacts():
+    CompilationArtifact.objects.filter(
+        used_at__lt=timezone.now() - timedelta(
+            seconds=settings.JUDGE_COMPILATION_ARTIFACT_TTL)).delete()
+
+
+def get_judged_submission(submission_id):
+    """
+    :return submission with problem and tests query for judging.
+    """
     submission = Submission.objects.get(pk=submission_id)
+    # Compiled artifacts are loaded only if worker does not have them cached
+    submission.problem = Problem.objects.defer(
+        'solution_compiled', 'checker_compiled', 'interactor_compiled').get(
+        pk=submission.problem_id)
+    tests = submission.problem.test_set.order_by('index').select_related(
+        'generator').defer('generator__generator_compiled')
+    return submission, tests
+
+
+def start_testing(submission):
     submission.erase_verdict()
     submission.tested = False
     submission.testing = True
     submission.save()
+    # also drops progress of previous attempt
+    publish_submission_state(submission)
 
-    tests = submission.problem.test_set.order_by('index')
 
-    app_path, folder = prepare_sandbox_folder()
+@app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+          default_retry_delay=10)
+def judge_submission_task(submission_id):
+    submission, tests = get_judged_submission(submission_id)
+    start_testing(submission)
+
+    sandbox_root, folder = prepare_sandbox_folder(
+        estimate_sandbox_size(tests))
 
     if submission.problem.is_sub_task:
         try:
             return run_judge_sandbox_sub_task_problem(submission, tests,
-                                                      app_path, folder)
+                                                      sandbox_root, folder)
         except Exception as e:
-            subprocess.run(f'rm -rf {app_path}{folder}', shell=True)
+            remove_tree(f'{sandbox_root}{folder}')
             submission.testing = False
             submission.tested = True
             submission.verdict = Submission.TE
             submission.verdict_message = 'Test Error'
             submission.save()
+            publish_submission_state(submission)
             raise e
     if submission.problem.is_graded:
         pass
     elif submission.submission_type in [Submission.CPP17, Submission.PYTHON3]:
         try:
-            return run_judge_sandbox(submission, tests, app_path, folder)
+            return run_judge_sandbox(submission, tests, sandbox_root, folder)
         except Exception as e:
-            subprocess.run(f'rm -rf {app_path}{folder}', shell=True)
+            remove_tree(f'{sandbox_root}{folder}')
             submission.testing = False
             submission.tested = True
             submission.verdict = Submission.TE
             submission.verdict_message = 'Test Error'
             submission.save()
+            publish_submission_state(submission)
             raise e
     # we don't wont any collision
-    subprocess.run(f'rm -rf {app_path}{folder}', shell=True)
+    remove_tree(f'{sandbox_root}{folder}')
     return
 
 
+# ------------------------------------------------------------------------------
+# Judging in slices (Problem.judge_slice_count > 1)
+# Tests are dealt to slices like cards (test i goes to slice i % count), each
+# slice is judged by its own task, usually on another worker, and
+# aggregate_test_slices_task computes verdict when all of them are done:
+#   prepare_test_slices_task | chord(judge_test_slice_task...,
+#                                    aggregate_test_slices_task)
+# Slices of problem that stops on first failure stop on their own first
+# failure, results after the first failure in tests order are dropped by
+# aggregation, so verdict is the same as of sequential judging.
+# Every slice compiles artifacts it needs, but artifact caches make it once
+# per worker.
+
+
+def is_judged_in_slices(problem):
+    return problem.judge_slice_count > 1 and not problem.is_graded
+
+
+@app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+          default_retry_delay=10)
+def prepare_test_slices_task(submission_id):
+    submission = Submission.objects.select_related('problem').get(
+        pk=submission_id)
+    start_testing(submission)
+    if submission.problem.is_sub_task:
+        create_test_group_results(submission)
+    return submission_id
+
+
+@app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+          default_retry_delay=10)
+def judge_test_slice_task(submission_id, slice_index, slice_count):
+    """
+    Judges tests of slice `slice_index`, results are saved.
+    :return Submission.CP on compilation error, Submission.OK otherwise.
+    """
+    submission, tests = get_judged_submission(submission_id)
+    if submission.submission_type not in [Submission.CPP17,
+                                          Submission.PYTHON3]:
+        return Submission.OK
+    tests = list(tests)[slice_index::slice_count]
+    if not tests:
+        return Submission.OK
+    # results of previous attempt of this slice
+    submission.submissiontestresult_set.filter(
+        test__in=[test.pk for test in tests]).delete()
+
+    sandbox_root, folder = prepare_sandbox_folder(
+        estimate_sandbox_size(tests))
+    try:
+        if copy_payload_and_compile_all(submission, tests, sandbox_root,
+                                        folder) == Submission.CP:
+            return Submission.CP
+        chmod_tree(f'{sandbox_root}{folder}', 0o777)
+        chmod_tree(f'{sandbox_root}{folder}/usercode', 0o677)
+        print(f'Files copied and compiled, slice {slice_index}')
+
+        if submission.problem.is_sub_task:
+            test_group_results = {
+                test_group_result.test_group_id: test_group_result
+                for test_group_result in
+                submission.submissiontestgroupresult_set.all()}
+            test_results = run_tests(submission, tests, sandbox_root, folder,
+                                     stop_on_failure=False,
+                                     result_buffer=TestResultBuffer(
+                                         test_group_results))
+            update_test_statistics(test_results)
+        else:
+            run_tests_failing_first(submission, tests, sandbox_root, folder,
+                                    TestResultBuffer())
+    finally:
+        remove_tree(f'{sandbox_root}{folder}')
+    return Submission.OK
+
+
+@app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+          default_retry_delay=10)
+def aggregate_test_slices_task(slice_verdicts, submission_id):
+    """
+    Computes verdict of submission judged in slices from saved results.
+    """
+    submission = Submission.objects.select_related('problem').get(
+        pk=submission_id)
+    if Submission.CP in slice_verdicts:
+        # verdict is already set by compilation
+        publish_submission_state(submission)
+        return Submission.CP
+
+    test_results = list(submission.submissiontestresult_set.select_related(
+        'test').order_by('test__index'))
+    if submission.problem.is_sub_task:
+        test_group_results = {
+            test_group_result.test_group_id: test_group_result
+            for test_group_result in
+            submission.submissiontestgroupresult_set.select_related(
+                'test_group')}
+        apply_sub_task_points(submission, test_group_results, test_results)
+    else:
+        for position, test_result in enumerate(test_results):
+            if test_result.verdict != SubmissionTestResult.OK:
+                # other slices may have gone further
+                submission.submissiontestresult_set.filter(
+                    test__index__gt=test_result.test.index).delete()
+                test_results = test_results[:position + 1]
+                break
+        if not test_results:
+            set_test_error(submission, debug_message='Problem has no tests')
+            submission.save()
+            publish_submission_state(submission)
+            return Submission.TE
+        submission.verdict = test_results[-1].verdict
+        submission.verdict_message = test_results[-1].verdict_message
+    apply_resources_usage(submission, test_results)
+    submission.testing = False
+    submission.tested = True
+    submission.save()
+    publish_submission_state(submission)
+    return Submission.OK
+# ==============================================================================
+
+
+# ------------------------------------------------------------------------------
+# Invocations (see polygon.judge.run_invocation)
+# Every solution of invocation is executed on all its tests, results are saved
+# as InvocationResult, solution itself and its progress are not changed.
+# Inputs and answers are cached by content, so with many solutions they are
+# generated once per worker host.
+
+
+def save_invocation_results(invocation_id, submission_id, tests, verdict,
+                            verdict_message):
+    """
+    Saves the same result of solution for all tests that have no result yet
+    (e.g. compilation error).
+    """
+    done = set(InvocationResult.objects.filter(
+        invocation_id=invocation_id, solution_id=submission_id).values_list(
+        'test_id', flat=True))
+    InvocationResult.objects.bulk_create(
+        InvocationResult(invocation_id=invocation_id, solution_id=submission_id,
+                         test=test, verdict=verdict,
+                         verdict_message=verdict_message)
+        for test in tests if test.pk not in done)
+
+
+def copy_payload_and_compile_invocation(submission, sandbox_root, folder):
+    """
+    Same as copy_payload_and_compile_all, but nothing is written to
+    solution of invocation.
+    :return None on success, otherwise CompilationArtifact of failed
+    compilation of solution.
+    """
+    if not copy_payload(sandbox_root, folder):
+        raise Exception('Copy payload failed')
+    if needs_compilation(submission):
+        artifact = put_submission_binary(submission,
+                                         f'{sandbox_root}{folder}')
+        if artifact is not None:
+            return artifact
+    else:
+        compilation_dict[submission.submission_type](sandbox_root, folder,
+                                                     submission)
+    copy_or_compile_problem(None, submission.problem, sandbox_root, folder)
+    return None
+
+
+@app.task(autoretry_for=(Exception,), retry_kwargs={'max_retries': 3},
+          default_retry_delay=10)
+def judge_invocation_solution_task(submission_id, invocation_id):
+    submission, tests = get_judged_submission(submission_id)
+    tests = list(tests.filter(invocation=invocation_id))
+    # results of previous attempt
+    InvocationResult.objects.filter(invocation_id=invocation_id,
+                                    solution_id=submission_id).delete()
+
+    sandbox_root, folder = prepare_sandbox_folder(
+        estimate_sandbox_size(tests))
+    try:
+        if copy_payload_and_compile_invocation(submission, sandbox_root,
+                                               folder) is not None:
+            save_invocation_results(invocation_id, submission_id, tests,
+                                    Submission.CP, 'Compilation Error')
+            return
+        chmod_tree(f'{sandbox_root}{folder}', 0o777)
+        chmod_tree(f'{sandbox_root}{folder}/usercode', 0o677)
+        test_results = run_tests(submission, tests, sandbox_root, folder,
+                                 stop_on_failure=False, result_buffer=None,
+                                 report_progress=False)
+        InvocationResult.objects.bulk_create(
+            InvocationResult(invocation_id=invocation_id,
+                             solution_id=submission_id,
+                             test=test_result.test,
+                             time_used=test_result.time_used,
+                             memory_used=test_result.memory_used,
+                             verdict=test_result.verdict,
+                             verdict_message=test_result.verdict_message)
+            for test_result in test_results)
+    finally:
+        remove_tree(f'{sandbox_root}{folder}')
+
+
+@app.task
+def invocation_run_on_error(request, exc, traceback, submission_id,
+                            invocation_id):
+    print('Task {0!r} raised error: {1!r}'.format(request.id, exc))
+    save_invocation_results(
+        invocation_id, submission_id,
+        Test.objects.filter(invocation=invocation_id), Submission.TE,
+        'Test failed, notify admin')
+# ==============================================================================
+
+
+@app.task
+def prewarm_test_inputs(problem_id):
+    """
+    Generates inputs of all generated tests of problem into input cache,
+    so submissions do not wait for generators. Up to JUDGE_BOX_COUNT
+    generators run at once. Hash and size of every input (or generator
+    error) are saved to its test, so authors see them before judging.
+    """
+    problem = Problem.objects.defer(
+        'solution_compiled', 'checker_compiled', 'interactor_compiled').get(
+        pk=problem_id)
+    tests = list(problem.test_set.filter(use_generator=True).select_related(
+        'generator').defer('generator__generator_compiled'))
+    sandbox_root, folder = prepare_sandbox_folder()
+    try:
+        make_dirs(f'{sandbox_root}{folder}')
+        copy_or_compile_generators(None, problem, sandbox_root, folder)
+        # every thread writes inputs to its own folder
+        input_folders = queue.Queue()
+        for i in range(max(1, min(settings.JUDGE_BOX_COUNT, len(tests)))):
+            make_dirs(f'{sandbox_root}{folder}/inputs{i}')
+            input_folders.put(f'{folder}/inputs{i}')
+
+        def generate(test):
+            input_folder = input_folders.get()
+            try:
+                cp = run_generator(test, sandbox_root, folder, input_folder)
+                if cp is not None:
+                    test.generated_hash = ''
+                    test.generated_size = 0
+                    test.generation_error = \
+                        f'Generator exit code {cp.returncode}\n' \
+                        f'{cp.stderr.decode(errors="replace")}'
+                    print(f'Generator: {test.generator} runtime error on '
+                          f'test #{test.index}\n{test.generation_error}')
+                    return
+                input_path = f'{sandbox_root}{input_folder}/input_file'
+                test.generated_hash = hash_file(input_path)
+                test.generated_size = os.path.getsize(input_path)
+                test.generation_error = ''
+            finally:
+                input_folders.put(input_folder)
+
+        tests = [test for test in tests if test.generator is not None]
+        with ThreadPoolExecutor(max_workers=input_folders.qsize()) as executor:
+            # result() re-raises exceptions of generate
+            for future in [executor.submit(generate, test) for test in tests]:
+                future.result()
+        Test.objects.bulk_update(tests, ['generated_hash', 'generated_size',
+                                         'generation_error'], batch_size=500)
+    finally:
+        remove_tree(f'{sandbox_root}{folder}')
+
+
+@worker_ready.connect
+def collect_sandbox_folders_on_start(**kwargs):
+    # folders of tasks killed with previous worker
+    collect_orphaned_sandbox_folders()
+
+
+@app.task
+def run_rejudge_job(job_id):
+    """
+    Rejudges next JUDGE_REJUDGE_CHUNK_SIZE submissions of job and schedules
+    itself for the next chunk, so judging tasks are enqueued with rate
+    JUDGE_REJUDGE_RATE submissions per second. Submissions that are already
+    in queue or testing are skipped.
+    """
+    # judge imports this module
+    from .judge import REJUDGE, judge_submission
+
+    job = RejudgeJob.objects.get(pk=job_id)
+    if job.status in (RejudgeJob.DONE, RejudgeJob.CANCELLED):
+        return
+    submissions = job.get_submissions()
+    if job.status == RejudgeJob.PENDING:
+        job.total = submissions.count()
+        job.status = RejudgeJob.RUNNING
+        job.save(update_fields=['total', 'status'])
+
+    submission_ids = list(submissions.filter(
+        pk__gt=job.last_submission_id).order_by('pk').values_list(
+        'pk', flat=True).distinct()[:settings.JUDGE_REJUDGE_CHUNK_SIZE])
+    if not submission_ids:
+        RejudgeJob.objects.filter(pk=job_id, status=RejudgeJob.RUNNING).update(
+            status=RejudgeJob.DONE)
+        return
+
+    queued_count = 0
+    skipped_count = 0
+    for submission in Submission.objects.filter(
+            pk__in=submission_ids).select_related('problem'):
+        if submission.in_queue or submission.testing:
+            skipped_count += 1
+            continue
+        judge_submission(submission, origin=REJUDGE)
+        queued_count += 1
+    # job can be cancelled meanwhile, so only progress is updated
+    RejudgeJob.objects.filter(pk=job_id).update(
+        queued_count=F('queued_count') + queued_count,
+        skipped_count=F('skipped_count') + skipped_count,
+        last_submission_id=submission_ids[-1])
+    run_rejudge_job.apply_async(
+        (job_id,),
+        countdown=len(submission_ids) / settings.JUDGE_REJUDGE_RATE)
+
+
 @app.task
 def sandbox_run_on_error(request, exc, traceback,
                          submission_id):
     print('Task {0!r} raised error: {1!r}'.format(request.id, exc))
     submission = Submission.objects.get(pk=submission_id)
     if submission:
+        # e.g. compilation failed before testing started, submission must
+        # not stay in queue (rejudge jobs skip submissions in queue)
+        submission.in_queue = False
         submission.testing = False
         submission.tested = True
         submission.verdict = submission.TE
         submission.verdict_message = f'Test failed, notify admin'
         submission.verdict_debug_description = str(traceback)
         submission.save()
+        publish_submission_state(submission)
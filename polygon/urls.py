@@ -45,6 +45,9 @@ urlpatterns = [
     path('problem/<int:pk>/test/generate_tests_from_script',
          views.generate_tests_from_script,
          name='polygon.views.generate_tests_from_script'),
+    path('problem/<int:pk>/test/pregenerate_test_inputs',
+         views.pregenerate_test_inputs,
+         name='polygon.views.pregenerate_test_inputs'),
     path('problem/<int:pk>/test/import_tests_from_files',
          views.import_tests_from_files,
          name='polygon.views.import_tests_from_files'),
@@ -91,6 +94,14 @@ urlpatterns = [
          name='polygon.views.rejudge_submission'),
     path('submission/rejudge', views.rejudge_submissions,
          name='polygon.views.rejudge_submissions'),
+    path('submission/rejudge/<int:pk>/cancel', views.cancel_rejudge_job,
+         name='polygon.views.cancel_rejudge_job'),
+
+    path('problem/<int:pk>/invocation/', views.view_invocations,
+         name='polygon.views.invocations'),
+    path('problem/<int:problem_id>/invocation/<int:pk>',
+         views.view_invocation,
+         name='polygon.views.invocation'),
 
     # test_submission
     path('problem/<int:pk>/test_submission/', views.test_submission,
@@ -5,3 +5,4 @@ from .generators import *
 from .tests import *
 from .test_groups import *
 from .submissions import *
+from .invocations import *
@@ -73,6 +73,8 @@ def view_generator(request, problem_id, pk):
     form = GeneratorForm(request.POST or None, instance=generator)
     if request.method == 'POST':
         if form.is_valid():
+            if 'generator' in form.changed_data:
+                generator.generator_compiled = None
             form.save()
             messages.success(request, f'Generator "{generator.name}" saved')
             if form.cleaned_data['save_and_exit']:
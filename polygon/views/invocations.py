@@ -0,0 +1,137 @@
+from django import forms
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.shortcuts import get_object_or_404, redirect, render
+
+from polygon.judge import run_invocation
+from polygon.models import Invocation, Problem, Submission
+
+# Solutions faster than time limit / this on some test are highlighted
+min_time_headroom = 2
+
+
+class InvocationForm(forms.ModelForm):
+    class Meta:
+        model = Invocation
+        fields = ('solutions', 'tests')
+        widgets = {
+            'solutions': forms.CheckboxSelectMultiple,
+            'tests': forms.CheckboxSelectMultiple,
+        }
+
+    def __init__(self, problem, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # submissions made in polygon are made by staff, latest are offered
+        solution_ids = problem.submission_set.filter(
+            user__is_staff=True).order_by('-pk').values_list('pk', flat=True)
+        self.fields['solutions'].queryset = Submission.objects.filter(
+            pk__in=list(solution_ids[:50])).order_by('-pk')
+        self.fields['solutions'].label_from_instance = \
+            lambda submission: f'#{submission.pk} ' \
+                               f'{submission.get_submission_type_display()} ' \
+                               f'{submission.get_verdict()}'
+        self.fields['tests'].queryset = problem.test_set.order_by('index')
+        self.fields['tests'].label_from_instance = \
+            lambda test: f'#{test.index}'
+
+
+@login_required()
+@staff_member_required()
+def view_invocations(request, pk):
+    problem = get_object_or_404(Problem, pk=pk)
+    form = InvocationForm(problem, request.POST or None, initial={
+        'tests': problem.test_set.values_list('pk', flat=True)})
+    if request.method == 'POST':
+        if form.is_valid():
+            with transaction.atomic():
+                invocation = form.save(commit=False)
+                invocation.problem = problem
+                invocation.created_by = request.user
+                invocation.save()
+                form.save_m2m()
+                transaction.on_commit(lambda: run_invocation(invocation))
+            messages.success(request, f'Invocation #{invocation.pk} created')
+            return redirect('polygon.views.invocation', problem_id=pk,
+                            pk=invocation.pk)
+    return render(request, 'polygon/invocation/invocations.html',
+                  context={'form': form,
+                           'problem': problem,
+                           'invocations': problem.invocation_set.order_by(
+                               '-pk')[:20]})
+
+
+def get_invocation_rows(problem, solutions, tests, results):
+    """
+    :return row of grid for every test: results of solutions (None if there
+    is no result yet) and time headroom - time limit / slowest OK time.
+    """
+    rows = []
+    for test in tests:
+        cells = [results.get((test.pk, solution.pk)) for solution in solutions]
+        ok_times = [result.time_used for result in cells
+                    if result is not None and result.verdict == Submission.OK
+                    and result.time_used > 0]
+        max_ok_time = max(ok_times) if ok_times else None
+        rows.append({
+            'test': test,
+            'cells': cells,
+            'max_ok_time': max_ok_time,
+            'headroom': problem.time_limit / max_ok_time if max_ok_time
+            else None,
+        })
+    return rows
+
+
+def get_invocation_totals(solutions, rows):
+    """
+    :return first failed result and its test (in tests order), max time and
+    memory of every solution.
+    """
+    totals = []
+    for position, solution in enumerate(solutions):
+        results = [(row['test'], row['cells'][position]) for row in rows
+                   if row['cells'][position] is not None]
+        failed = [(test, result) for test, result in results
+                  if result.verdict != Submission.OK]
+        results = [result for _, result in results]
+        totals.append({
+            'solution': solution,
+            'failed_test': failed[0][0] if failed else None,
+            'verdict': failed[0][1] if failed else None,
+            'done': len(results),
+            'max_time_used': max((result.time_used for result in results),
+                                 default=-1),
+            'max_memory_used': max((result.memory_used for result in results),
+                                   default=-1),
+        })
+    return totals
+
+
+@login_required()
+@staff_member_required()
+def view_invocation(request, problem_id, pk):
+    problem = get_object_or_404(Problem, pk=problem_id)
+    invocation = get_object_or_404(Invocation, pk=pk, problem=problem)
+    solutions = list(invocation.solutions.order_by('pk'))
+    tests = list(invocation.tests.order_by('index'))
+    results = {(result.test_id, result.solution_id): result
+               for result in invocation.invocationresult_set.all()}
+    rows = get_invocation_rows(problem, solutions, tests, results)
+    headrooms = [row['headroom'] for row in rows
+                 if row['headroom'] is not None]
+    return render(request, 'polygon/invocation/invocation.html',
+                  context={'problem': problem,
+                           'invocation': invocation,
+                           'rows': rows,
+                           'totals': get_invocation_totals(solutions, rows),
+                           'is_done': len(results) == len(solutions) * len(
+                               tests),
+                           'max_ok_time': max(
+                               (row['max_ok_time'] for row in rows
+                                if row['max_ok_time'] is not None),
+                               default=None),
+                           'min_headroom': min(headrooms, default=None),
+                           'min_time_headroom': min_time_headroom,
+                           'Submission': Submission})
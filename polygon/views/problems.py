@@ -83,8 +83,8 @@ class ProblemForm(forms.ModelForm):
         model = Problem
         fields = (
             'name', 'time_limit', 'memory_limit', 'solution', 'checker',
-            'interactor', 'is_active', 'is_interactive', 'is_graded',
-            'is_sub_task')
+            'checker_type', 'checker_epsilon', 'interactor', 'is_active',
+            'is_interactive', 'is_graded', 'is_sub_task', 'judge_slice_count')
 
 
 @login_required()
@@ -98,6 +98,11 @@ def view_problem(request, pk):
                 messages.error(request, f'You can not make problem is_graded '
                                         f'and is_sub_task at the same time')
             else:
+                # compiled binaries must always match their sources,
+                # workers cache them by source hash.
+                for field in ('solution', 'checker', 'interactor'):
+                    if field in form.changed_data:
+                        setattr(problem, f'{field}_compiled', None)
                 form.save()
                 messages.success(request, f'Problem "{problem.name}" saved!')
     return render(request, 'polygon/problem/problem.html',
@@ -1,11 +1,15 @@
 from django import forms
+from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 
 from polygon.judge import judge_submission
-from polygon.models import Submission, Problem, SubmissionTestGroupResult
+from polygon.models import Submission, Problem, SubmissionTestGroupResult, \
+    RejudgeJob
+from polygon.tasks import run_rejudge_job
 
 
 class TestSubmissionForm(forms.ModelForm):
@@ -69,13 +73,40 @@ def rejudge_submission(request, pk):
     return redirect('polygon.views.submission', pk=pk)
 
 
+class RejudgeJobForm(forms.ModelForm):
+    class Meta:
+        model = RejudgeJob
+        fields = ('problem', 'contest', 'verdict', 'submitted_after',
+                  'submitted_before')
+
+
 @login_required()
 @staff_member_required()
 def rejudge_submissions(request):
-    for submission in Submission.objects.all():
-        judge_submission(submission)
-        # problem = submission.problem
-        # (judge_submission.s(submission.pk, 0) | run_sandbox.s() | parse_sandbox_result.s(submission.pk, 0)).apply_async()
-        # chord((judge_submission.s(submission.pk, test.pk) | run_sandbox.s() | parse_sandbox_result.s(submission.pk, test.pk)) for test in problem.test_set.all())(apply_submission_result.s(submission.pk))
+    """
+    Submissions are rejudged in background by run_rejudge_job, here jobs
+    are only created and shown.
+    """
+    form = RejudgeJobForm(request.POST or None)
+    if request.method == 'POST':
+        if form.is_valid():
+            job = form.save(commit=False)
+            job.created_by = request.user
+            job.save()
+            transaction.on_commit(lambda: run_rejudge_job.delay(job.pk))
+            messages.success(request, f'Rejudge job #{job.pk} created')
+            return redirect('polygon.views.rejudge_submissions')
+    return render(request, 'polygon/submission/rejudge.html',
+                  context={'form': form,
+                           'jobs': RejudgeJob.objects.order_by('-pk')[:50],
+                           'RejudgeJob': RejudgeJob})
 
-    return redirect('polygon.views.submissions')
\ No newline at end of file
+
+@login_required()
+@staff_member_required()
+def cancel_rejudge_job(request, pk):
+    if request.method == 'POST':
+        RejudgeJob.objects.filter(
+            pk=pk, status__in=[RejudgeJob.PENDING, RejudgeJob.RUNNING]).update(
+            status=RejudgeJob.CANCELLED)
+    return redirect('polygon.views.rejudge_submissions')
@@ -1,5 +1,8 @@
 import json
+import os
 import re
+import tarfile
+import zipfile
 
 from django import forms
 from django.contrib import messages
@@ -10,7 +13,9 @@ from django.db.models import Max
 from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render, HttpResponse
 
+from polygon.blob_store import blob_store
 from polygon.models import Problem, Generator, Test, TestGroup
+from polygon.tasks import prewarm_test_inputs
 from utils import reorder_models_indexes
 
 
@@ -20,19 +25,61 @@ def view_tests(request, pk):
     problem = get_object_or_404(Problem, pk=pk)
     return render(request, 'polygon/test/tests.html',
                   context={'problem': problem,
-                           'tests': problem.test_set.all().order_by('index'),
+                           'tests': problem.test_set.all().order_by(
+                               'index').select_related('generator').defer(
+                               'generator__generator',
+                               'generator__generator_compiled'),
                            'test_groups': problem.testgroup_set.all().order_by(
                                'index')
                            })
 
 
+# Larger inputs are not shown in test form, they are replaced by upload
+max_editable_test_size = 64 * 1024
+
+
 class CreateTestForm(forms.ModelForm):
+    # generator arguments or input of test
+    data = forms.CharField(required=False, strip=False, widget=forms.Textarea)
+    data_file = forms.FileField(required=False)
+
     class Meta:
         model = Test
         fields = ('index', 'data', 'use_generator', 'generator', 'is_example',
                   'example_answer', 'example_input')
 
 
+def get_editable_test_data(test):
+    """
+    :return text for data field of test form, None if input of test is
+    binary or too large to edit.
+    """
+    if test.use_generator:
+        return test.data
+    if test.data_size > max_editable_test_size:
+        return None
+    try:
+        return test.read_data().decode()
+    except UnicodeDecodeError:
+        return None
+
+
+def save_test_form(form, test):
+    """
+    Saves test of form, input of not generated test goes to blob store
+    (uploaded file takes precedence over data field).
+    """
+    if not test.use_generator:
+        data_file = form.cleaned_data['data_file']
+        if data_file is not None:
+            test.set_data(data_file)
+        elif 'data' in form.changed_data or not test.data_hash or \
+                'use_generator' in form.changed_data:
+            test.set_data(form.cleaned_data['data'])
+        test.data = ''
+    test.save()
+
+
 @login_required()
 @staff_member_required()
 def create_test(request, pk):
@@ -40,14 +87,14 @@ def create_test(request, pk):
     next_test_index = Test.objects.filter(problem=problem).aggregate(
         Max('index'))
 
-    form = CreateTestForm(request.POST or None, initial={
+    form = CreateTestForm(request.POST or None, request.FILES or None, initial={
         'index': next_test_index['index__max'] + 1 if next_test_index[
                                                           'index__max'] is not None else '0'})
     if request.method == 'POST':
         if form.is_valid():
             test = form.save(commit=False)
             test.problem = problem
-            test.save()
+            save_test_form(form, test)
             messages.success(request, f'Test index #{test.index} created')
             return redirect('polygon.views.tests', pk=problem.pk)
 
@@ -72,33 +119,31 @@ def delete_test(request, problem_id, pk):
     return redirect('polygon.views.tests', pk=problem_id)
 
 
-class TestForm(forms.ModelForm):
+class TestForm(CreateTestForm):
     save_and_exit = forms.BooleanField(required=False)
 
-    class Meta:
-        model = Test
-        fields = ('index', 'data', 'use_generator', 'generator', 'is_example',
-                  'example_answer', 'example_input')
-
 
 @login_required()
 @staff_member_required()
 def view_test(request, problem_id, pk):
     test = get_object_or_404(Test, pk=pk)
-    form = TestForm(request.POST or None, instance=test)
+    editable_data = get_editable_test_data(test)
+    form = TestForm(request.POST or None, request.FILES or None, instance=test,
+                    initial={'data': editable_data or ''})
     problem = get_object_or_404(Problem, pk=problem_id)
     if test.problem.pk != problem_id:
         messages.error(request, f"test do not belongs to given problem.")
         return redirect('polygon.views.index')
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            save_test_form(form, form.save(commit=False))
             messages.success(request, f'Test #{test.index} saved')
             if form.cleaned_data['save_and_exit']:
                 return redirect('polygon.views.tests', pk=problem_id)
 
     return render(request, 'polygon/test/test.html',
                   context={'form': form, 'test': test,
+                           'is_data_editable': editable_data is not None,
                            'generators': Generator.objects.filter(
                                problem=problem),
                            'problem': problem})
@@ -146,6 +191,7 @@ def delete_all_tests(request, pk):
 
 class TestGeneratorScriptForm(forms.Form):
     script = forms.CharField(required=True, widget=forms.Textarea)
+    pregenerate = forms.BooleanField(required=False)
 
 
 @login_required()
@@ -162,6 +208,8 @@ def generate_tests_from_script(request, pk):
         command_line_regex = re.compile(r'^([\w]+) (.*) > ([\d]+|\$)$')
         # argument_regex = re.compile(r'".*"|[\S]+')
 
+        generators = {generator.name: generator for generator in
+                      problem.generator_set.only('pk', 'name')}
         occupied_test_indexes = set(problem.test_set.filter(
             use_generator=False).values_list('index', flat=True))
         current_index = 0
@@ -172,7 +220,7 @@ def generate_tests_from_script(request, pk):
                 messages.error(request, 'Invalid script format')
                 return redirect('polygon.views.tests', pk=pk)
             generator_name, args, test_index = m.groups()
-            if not problem.generator_set.filter(name=generator_name).exists():
+            if generator_name not in generators:
                 messages.error(request,
                                'Invalid script format: wrong generator name')
                 return redirect('polygon.views.tests', pk=pk)
@@ -186,27 +234,133 @@ def generate_tests_from_script(request, pk):
                 messages.error(request,
                                f'Invalid script format: test index clash, test #{test_index}')
                 return redirect('polygon.views.tests', pk=pk)
+            else:
+                test_index = int(test_index)
             occupied_test_indexes.add(test_index)
             new_tests.append(Test(index=test_index,
                                   data=args,
-                                  generator=problem.generator_set.get(
-                                      name=generator_name),
+                                  generator=generators[generator_name],
                                   use_generator=True,
                                   problem=problem
                                   )
                              )
         problem.test_set.filter(use_generator=True).delete()
         problem.save()
-        for test in new_tests:
-            test.save()
+        Test.objects.bulk_create(new_tests, batch_size=500)
+        if form.cleaned_data['pregenerate']:
+            # generate new inputs on worker before anyone submits
+            transaction.on_commit(
+                lambda: prewarm_test_inputs.delay(problem.pk))
     else:
         messages.error(request, 'Invalid script format')
     return redirect('polygon.views.tests', pk=pk)
 
 
+@login_required()
+@staff_member_required()
+def pregenerate_test_inputs(request, pk):
+    problem = get_object_or_404(Problem, pk=pk)
+    if request.method == 'POST':
+        prewarm_test_inputs.delay(problem.pk)
+        messages.success(request, 'Inputs of generated tests are being '
+                                  'generated, reload page to see them')
+        return redirect('polygon.views.tests', pk=pk)
+    return HttpResponseBadRequest()
+
+
 class ImportTestsFromFilesForm(forms.Form):
     tests_files = forms.FileField(
+        required=False,
         widget=forms.ClearableFileInput(attrs={'multiple': True}))
+    archive = forms.FileField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('tests_files') and \
+                not cleaned_data.get('archive'):
+            raise forms.ValidationError('Pick tests files or archive')
+        return cleaned_data
+
+
+# File name of test is its index `N` or `N$` - first free index
+test_file_name_regex = re.compile(r'^\d+\$?$')
+
+
+def iterate_archive(archive):
+    """
+    Yields name and file object of every file in zip or tar (possibly
+    compressed) archive, hidden files are skipped. Tar is read as a stream,
+    so file object is valid only until the next one is yielded.
+    """
+    if zipfile.is_zipfile(archive):
+        archive.seek(0)
+        with zipfile.ZipFile(archive) as zip_file:
+            for info in zip_file.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or name.startswith('.'):
+                    continue
+                with zip_file.open(info) as f:
+                    yield name, f
+        return
+    archive.seek(0)
+    with tarfile.open(fileobj=archive, mode='r|*') as tar_file:
+        for member in tar_file:
+            name = os.path.basename(member.name)
+            if not member.isfile() or name.startswith('.'):
+                continue
+            yield name, tar_file.extractfile(member)
+
+
+def import_test_files(problem, files):
+    """
+    Puts files to blob store and creates tests of problem with them, tests
+    with the same indexes are overwritten. `N$` files take first free
+    indexes in order of their names.
+    :param files: name and file object of every test, every file is read
+    only when it is yielded.
+    :return count of imported tests.
+    :raises ValueError on invalid name or index clash, nothing is saved then.
+    """
+    inputs = []
+    for name, f in files:
+        if not test_file_name_regex.match(name):
+            raise ValueError(f'Invalid file name {name}')
+        inputs.append((name, *blob_store.put(f)))
+    inputs.sort()
+
+    indexes = dict()
+    for name, _, _ in inputs:
+        if not name.endswith('$'):
+            if int(name) in indexes.values():
+                raise ValueError(f'Test index clash, test #{int(name)}')
+            indexes[name] = int(name)
+    existing_tests = {test.index: test for test in problem.test_set.all()}
+    occupied_test_indexes = set(existing_tests) | set(indexes.values())
+    current_index = 0
+    new_tests = []
+    updated_tests = []
+    for name, data_hash, data_size in inputs:
+        if name.endswith('$'):
+            while current_index in occupied_test_indexes:
+                current_index += 1
+            occupied_test_indexes.add(current_index)
+            indexes[name] = current_index
+        test = existing_tests.get(indexes[name])
+        if test is None:
+            new_tests.append(Test(index=indexes[name], problem=problem,
+                                  data_hash=data_hash, data_size=data_size))
+        else:
+            # then overwrite
+            test.use_generator = False
+            test.data = ''
+            test.data_hash = data_hash
+            test.data_size = data_size
+            updated_tests.append(test)
+    Test.objects.bulk_create(new_tests, batch_size=500)
+    Test.objects.bulk_update(updated_tests, ['use_generator', 'data',
+                                             'data_hash', 'data_size'],
+                             batch_size=500)
+    return len(inputs)
 
 
 @login_required()
@@ -218,50 +372,19 @@ def import_tests_from_files(request, pk):
 
     if request.method == 'POST':
         if form.is_valid():
-            files = request.FILES.getlist('tests_files')
-            files.sort(key=lambda file: file.name)
-            for f in files:
-                if not str(f.name).isnumeric() and \
-                        not re.match(r'^\d+\$?$', f.name):
-                    messages.error(request, f'Invalid file name {f.name}')
-                    return render(request,
-                                  'polygon/test/import_tests_from_files.html',
-                                  context={
-                                      'form': form,
-                                      'problem': problem,
-                                  })
-            occupied_test_indexes = set(
-                problem.test_set.values_list('index', flat=True))
-            test_indexes_to_be_added = set()
-            current_index = 0
-            new_tests = []
-            for f in files:
-                test_index = f.name
-                if re.match(r'^\d+\$$', test_index):
-                    while current_index in occupied_test_indexes or current_index in test_indexes_to_be_added:
-                        current_index += 1
-                    test_index = current_index
-                elif int(test_index) in test_indexes_to_be_added:
-                    test_index = int(test_index)
-                    messages.error(request,
-                                   f'Invalid script format: test index clash, test #{test_index}')
-                    return redirect('polygon.views.tests', pk=pk)
-                test_index = int(test_index)
-                if test_index in occupied_test_indexes:
-                    # then overwrite
-                    new_test = problem.test_set.get(index=test_index)
-                    new_test.data = f.read().decode()
-                else:
-                    new_test = Test(index=test_index,
-                                    problem=problem,
-                                    data=f.read().decode())
-                test_indexes_to_be_added.add(current_index)
-                new_tests.append(new_test)
-            for test in new_tests:
-                test.save()
-            messages.success(request,
-                             f'Tests from files: {[f.name for f in files]} added')
-            return redirect('polygon.views.tests', pk=problem.pk)
+            archive = form.cleaned_data['archive']
+            if archive is not None:
+                files = iterate_archive(archive)
+            else:
+                files = ((f.name, f)
+                         for f in request.FILES.getlist('tests_files'))
+            try:
+                count = import_test_files(problem, files)
+            except (ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'{count} tests imported')
+                return redirect('polygon.views.tests', pk=problem.pk)
 
     return render(request, 'polygon/test/import_tests_from_files.html',
                   context={
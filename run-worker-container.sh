@@ -1,4 +1,4 @@
 #!/bin/bash
 
 # For dev
-docker run --env CELERY_BACKEND=redis://host.docker.internal:6379 --env CELERY_BROKER=redis://host.docker.internal:6379 --network host -it --cap-add=ALL --privileged -v `pwd`/db.sqlite3:/app/db.sqlite3 --rm arrow-celery
\ No newline at end of file
+docker run --env CELERY_BACKEND=redis://host.docker.internal:6379 --env CELERY_BROKER=redis://host.docker.internal:6379 --network host -it --cap-add=ALL --privileged --tmpfs /sandbox:rw,exec,size=2g --env JUDGE_SANDBOX_ROOT=/sandbox -v `pwd`/db.sqlite3:/app/db.sqlite3 --rm arrow-celery
\ No newline at end of file
@@ -6,4 +6,20 @@ cd /app
 
 #python3 app.py
 #flask run --host 0.0.0.0
-celery -A arrow worker -Q sandbox_execution -l info --concurrency=1
\ No newline at end of file
+# Submissions are compiled by separate worker, so compilation bursts do not
+# take judging slots
+celery -A arrow worker -Q compilation -n compilation@%h -l info \
+  --concurrency=${COMPILATION_CONCURRENCY:-2} &
+# Queues are consumed in the listed order, so contest submissions are judged
+# first. Set JUDGE_QUEUES (e.g. to judge_contest) to dedicate worker to a
+# subset of them.
+celery -A arrow worker \
+  -Q ${JUDGE_QUEUES:-judge_contest,judge_problemset,sandbox_execution,rejudge} \
+  -n sandbox@%h -l info --concurrency=1 &
+# Container exits (and is restarted by its restart policy) when any of
+# workers exits, so submissions never pile up in a queue nobody consumes.
+wait -n
+status=$?
+kill $(jobs -p) 2>/dev/null
+wait
+exit $status
\ No newline at end of file